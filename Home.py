@@ -3,19 +3,20 @@ from dotenv import load_dotenv
 
 load_dotenv()  # Loads environment variables from a .env file
 
-from db import SessionLocal, init_db
+from db import init_db, session_scope, read_session
 from models import Group, Service, GroupService
-from sqlalchemy import select, update, DateTime, or_
-from datetime import datetime
+from sqlalchemy import select, func
 import re
 import csv
 import io
-import requests
 from db_migrate import seed_initial_data   # optional helper
-from check_webhooks import check_all_webhooks
+from scan_jobs import ScanJobs
+from config_snapshot import SnapshotStore, GroupRec
+from link_mutations import set_links_enabled, queue_notice, disabled_notice, save_link_edits, delete_links
+from onboarding import link_services, link_service_to_all_groups
 import pandas as pd
-from sqlalchemy.orm import joinedload
-import time
+
+DETAIL_PAGE_SIZE = 100   # links per page in the group detail grid
 
 # start_time = time.time()
 # st.write(f"Script start: 0s")
@@ -26,22 +27,33 @@ def get_db_connection():
     Streamlit will keep this result in memory, so clicking buttons
     won't trigger a 2-second database handshake.
     """
-    # 1. Create tables (expensive operation)
+    # 1. Apply pending migrations (a single version read when up to date)
     init_db()
 
-    # 2. Seed data if needed
-    db = SessionLocal()
-    try:
+    # 2. Seed data if needed. Checked even when nothing was migrated here:
+    # the Whop server or the worker may have created the tables first.
+    with session_scope() as db:
         if not db.query(Group).first():
             seed_initial_data(db)
-    finally:
-        db.close()
     return True
 
 
 # Initialize once
 get_db_connection()
 
+@st.cache_resource
+def get_snapshot_store():
+    """
+    Read-only groups/services/links snapshot shared by every rerun and browser tab.
+    Rebuilt only after a write through the app or when the DB probe sees a change.
+    """
+    return SnapshotStore()
+
+@st.cache_resource
+def get_scan_jobs():
+    """Health scan jobs for the whole server process: one scan at a time across all tabs."""
+    return ScanJobs()
+
 def make_key(name: str) -> str:
     key = name.strip().lower()
     key = re.sub(r'[^a-z0-9]+', '-', key)
@@ -49,6 +61,44 @@ def make_key(name: str) -> str:
     return key
 
 
+def _group_links_filter(group_id, search):
+    conditions = [GroupService.group_id == group_id]
+    if search:
+        conditions.append(func.lower(Service.name).contains(search.lower(), autoescape=True))
+    return conditions
+
+
+def count_group_links(session, group_id, search=""):
+    return session.execute(
+        select(func.count(GroupService.id))
+        .join(Service, GroupService.service_id == Service.id)
+        .where(*_group_links_filter(group_id, search))
+    ).scalar()
+
+
+def load_group_links_page(session, group_id, search="", page=1):
+    """
+    One page of a group's links for the detail grid, sorted by service name.
+    Only the page's rows are read, so a rerun costs the same for 10 or 10,000 links.
+    """
+    return session.execute(
+        select(
+            GroupService.id,
+            Service.name,
+            GroupService.enabled,
+            GroupService.webhook_url,
+            GroupService.health_status,
+            GroupService.status_changed_at,
+            GroupService.webhook_updated_at,
+        )
+        .join(Service, GroupService.service_id == Service.id)
+        .where(*_group_links_filter(group_id, search))
+        .order_by(func.lower(Service.name), GroupService.id)
+        .offset((page - 1) * DETAIL_PAGE_SIZE)
+        .limit(DETAIL_PAGE_SIZE)
+    ).all()
+
+
 def make_group_csv_bytes(group):
     output = io.StringIO()
     writer = csv.writer(output)
@@ -82,30 +132,43 @@ def make_group_csv_bytes(group):
     output.close()
     return csv_str.encode("utf-8")
 
-def send_discord_message(webhook_url: str, content: str, username: str | None = None):
-    if not webhook_url or not content:
-        return
-
-    data = {
-        "content": content,
-    }
-    if username:
-        data["username"] = username
-
-    try:
-        resp = requests.post(webhook_url, json=data, timeout=5)
-        # Discord usually returns 204 for success
-        if not (200 <= resp.status_code < 300):
-            print(f"Discord webhook error {resp.status_code}: {resp.text}")
-    except Exception as e:
-        print(f"Failed to send Discord webhook: {e}")
-
 st.set_page_config(
     page_title="Discord Webhook Manager",
     layout="wide",
     initial_sidebar_state="expanded",
 )
 
+@st.fragment(run_every=1)
+def health_scan_progress(job_id):
+    # Reruns on its own every second without rerunning the page
+    job = get_scan_jobs().get(job_id)
+    if job is None:
+        st.session_state.pop("health_scan_job", None)
+        return
+
+    if job.active:
+        c1, c2 = st.columns([5, 1])
+        with c1:
+            st.progress(
+                job.checked / job.total if job.total else 0.0,
+                text=f"Scan {job.id}: {job.checked}/{job.total} checked · {job.failures} failing",
+            )
+        with c2:
+            if st.button("Cancel scan", disabled=job.cancel_event.is_set()):
+                job.cancel()
+        return
+
+    # Finished: hand the job's results to the panel and redraw the page once
+    del st.session_state["health_scan_job"]
+    st.session_state["health_scan_results"] = job.results
+    if job.state == "failed":
+        st.toast(f"Scan failed: {job.error}", icon="⚠️")
+    elif job.state == "cancelled":
+        st.toast(f"Scan cancelled after {job.checked}/{job.total} checks", icon="⏹️")
+    elif not job.results:
+        st.toast("✅ No broken webhooks found!", icon="🎉")
+    st.rerun()
+
 def health_check_button():
     # Initialize state variable if it doesn't exist
     if "health_scan_results" not in st.session_state:
@@ -116,44 +179,15 @@ def health_check_button():
     col_scan, col_clear = st.columns([2, 5])
 
     with col_scan:
-        # The button to trigger the DB query
-        if st.button("🔍 Scan for broken webhooks"):
-            check_all_webhooks()
-
-            with st.spinner("Checking database records..."):
-                # Run the query ONLY when button is clicked
-                broken_query = (
-                    session.query(GroupService)
-                    .options(
-                        joinedload(GroupService.group),
-                        joinedload(GroupService.service)
-                    )
-                    .filter(
-                        GroupService.enabled.is_(True),
-                        or_(
-                            GroupService.health_status == "missing",
-                            GroupService.health_status == "error",
-                        )
-                    )
-                    .all()
-                )
-
-                # Convert complex DB objects to simple dictionaries for session_state
-                # (This prevents crashes when the DB session closes)
-                results = []
-                for gs in broken_query:
-                    results.append({
-                        "group_name": gs.group.name,
-                        "service_name": gs.service.name,
-                        "status": gs.health_status,
-                        "code": gs.health_code,
-                        "checked_at": gs.health_checked_at
-                    })
+        # Full scan in a background thread; the progress fragment below polls it.
+        # Between manual scans the worker (python check_webhooks.py --worker)
+        # re-probes links whose last check is past its TTL.
+        if st.button("🔍 Scan for broken webhooks", disabled="health_scan_job" in st.session_state):
+            job = get_scan_jobs().submit()   # joins the running scan if there is one
+            st.session_state["health_scan_job"] = job.id
 
-                st.session_state["health_scan_results"] = results
-
-                if not results:
-                    st.toast("✅ No broken webhooks found!", icon="🎉")
+    if "health_scan_job" in st.session_state:
+        health_scan_progress(st.session_state["health_scan_job"])
 
     # Display the results if they exist in state
     broken_data = st.session_state["health_scan_results"]
@@ -222,24 +256,18 @@ def health_check_button():
 
                 st.markdown("<hr style='margin:6px 0 8px 0;'>", unsafe_allow_html=True)
 
-session = SessionLocal()
-
 st.title("Discord Webhook Manager")
 
-def load_and_display_groups():
+def load_and_display_groups(session):
     st.markdown("<a id='top'></a>", unsafe_allow_html=True)  # Anchor for the button
 
     health_check_button()
-    # 1. Fetch ALL Services and their links in one go
-    # We use joinedload so counting links in the "Service Overview" doesn't trigger more queries
-    all_services = (
-        session.query(Service)
-        .options(joinedload(Service.group_services))
-        .order_by(Service.name.asc())
-        .all()
-    )
+    # 1. Services, groups and links come from the cached snapshot (already sorted A→Z);
+    # a rerun only touches the DB when the config actually changed
+    with read_session() as rs:
+        snapshot = get_snapshot_store().get(rs)
+    all_services = snapshot.services
     # st.write(f"Services loaded: {time.time() - start_time:.2f}s")
-    all_services = sorted(all_services, key=lambda s: s.name.lower())
 
     # NEW: load services once, before anything else
     for k in ["new_name", "new_color", "new_img"]:
@@ -267,11 +295,12 @@ def load_and_display_groups():
 
         service_rows = []
         for svc in all_services:
-            total_links = len(svc.group_services)
-            enabled_links = sum(1 for gs in svc.group_services if gs.enabled)
-            service_rows.append((svc, total_links, enabled_links))
+            svc_links = snapshot.links_by_service.get(svc.id, ())
+            total_links = len(svc_links)
+            enabled_links = sum(1 for gs in svc_links if gs.enabled)
+            service_rows.append((svc, svc_links, total_links, enabled_links))
 
-        for svc, total_links, enabled_links in service_rows:
+        for svc, svc_links, total_links, enabled_links in service_rows:
             enabled_badge = f"{enabled_links}/{total_links} active" if total_links else "0 routed"
             status_color = "#16a34a" if enabled_links else "#6b7280"
 
@@ -320,7 +349,7 @@ def load_and_display_groups():
                         st.session_state[confirm_key_links] = True
                 
                 # Toggle enable/disable across all groups for this service
-                links_with_webhooks = [gs for gs in svc.group_services if gs.webhook_url]
+                links_with_webhooks = [gs for gs in svc_links if gs.webhook_url]
                 is_any_target_enabled = any(gs.enabled for gs in links_with_webhooks)
 
                 toggle_key = f"confirm_toggle_service_{svc.id}"
@@ -342,7 +371,7 @@ def load_and_display_groups():
                 c1, c2 = st.columns(2)
                 with c1:
                     if st.button("Yes, delete all", key=f"yes_confirm_delete_links_{svc.id}"):
-                        for gs in list(svc.group_services):
+                        for gs in session.query(GroupService).filter(GroupService.service_id == svc.id).all():
                             session.delete(gs)
                         session.commit()
                         st.session_state[f"confirm_delete_service_links_{svc.id}"] = False
@@ -354,7 +383,7 @@ def load_and_display_groups():
 
             # Confirmation & execution for Toggle enable/disable service across all groups
             if st.session_state.get(toggle_key):
-                links_with_webhooks = [gs for gs in svc.group_services if gs.webhook_url]
+                links_with_webhooks = [gs for gs in svc_links if gs.webhook_url]
                 is_any_target_enabled = any(gs.enabled for gs in links_with_webhooks)
                 action = "disable" if is_any_target_enabled else "enable"
 
@@ -362,19 +391,12 @@ def load_and_display_groups():
                 c_yes, c_no = st.columns(2)
                 with c_yes:
                     if st.button("Yes, do it", key=f"yes_toggle_{svc.id}"):
-                        now = datetime.utcnow()
-                        updated = 0
-                        target_state = not is_any_target_enabled
-                        
-                        for gs in links_with_webhooks:
-                            if gs.enabled != target_state:
-                                gs.enabled = target_state
-                                gs.status_changed_at = now
-                                updated += 1
-                        
-                        if updated > 0:
-                            session.commit()
-                        
+                        # One UPDATE ... RETURNING across every group with a webhook
+                        changed = set_links_enabled(
+                            session, not is_any_target_enabled, service_id=svc.id, with_webhook=True
+                        )
+                        updated = len(changed)
+
                         st.session_state[toggle_key] = False
                         toast_msg = f"{updated} link(s) for '{svc.name}' were {action}d." if updated > 0 else "No changes were needed."
                         st.toast(toast_msg)
@@ -392,11 +414,11 @@ def load_and_display_groups():
                     with c1:
                         if st.button("Yes, DELETE", key=f"yes_{confirm_key_del_svc}"):
                             # First delete all associated links
-                            for gs in list(svc.group_services):
+                            for gs in session.query(GroupService).filter(GroupService.service_id == svc.id).all():
                                 session.delete(gs)
                             
                             # Then delete the service itself
-                            session.delete(svc)
+                            session.delete(session.get(Service, svc.id))
                             session.commit()
                             
                             st.session_state[confirm_key_del_svc] = False
@@ -412,15 +434,18 @@ def load_and_display_groups():
 
         with st.form("add_service_form"):
             new_service_name = st.text_input("New service name")
+            link_to_all_groups = st.checkbox("Link to every group (disabled)", value=True)
             add_service_submitted = st.form_submit_button("Add service")
 
         if add_service_submitted and new_service_name:
             # Only create if not already present
             existing = session.query(Service).filter(Service.name == new_service_name).first()
             if existing is None:
-                session.add(Service(name=new_service_name))
+                service = Service(name=new_service_name)
+                session.add(service)
                 session.commit()
-                st.success(f"Service '{new_service_name}' added.")
+                linked = link_service_to_all_groups(session, service.id) if link_to_all_groups else 0
+                st.success(f"Service '{new_service_name}' added" + (f" and linked to {linked} group(s)." if linked else "."))
                 st.rerun()
             else:
                 st.warning("Service with that name already exists.")
@@ -463,13 +488,7 @@ def load_and_display_groups():
             session.commit()
 
             if mode == "All services":
-                links = [
-                    GroupService(group_id=group.id, service_id=s.id, enabled=False)
-                    for s in all_services
-                ]
-                if links:
-                    session.add_all(links)
-                    session.commit()
+                link_services(session, group.id)
 
             st.session_state["clear_new_group_form"] = True
             st.success("New group created.")
@@ -477,13 +496,13 @@ def load_and_display_groups():
 
     # --- NEW GROUP SELECTION ---
     st.markdown("### Select a Group")
-    # Fetch group objects for the selectbox, which is a fast query
-    groups_for_selection = session.query(Group).order_by(Group.name.asc()).all()
+    # Group records for the selectbox come straight from the snapshot
+    groups_for_selection = list(snapshot.groups)
     # Add a placeholder for the default option
     group_options = ["-- Select a group to manage --"] + groups_for_selection
 
     def format_group_for_display(g):
-        if not isinstance(g, Group):
+        if not isinstance(g, GroupRec):
             return g  # This is for the "-- Select..." placeholder
         
         display_text = g.name
@@ -498,22 +517,15 @@ def load_and_display_groups():
         key="group_selector",
     )
 
-    if not isinstance(selected_option, Group):
+    if not isinstance(selected_option, GroupRec):
         st.info("Select a group from the dropdown above to see its details and manage services.")
     else:
         # A group object was selected, so we use its ID to fetch the full details.
         # This prevents the MultipleResultsFound error if names are duplicated.
-        group = (
-            session.query(Group)
-            .options(
-                # This fetches the Group -> GroupService link
-                joinedload(Group.group_services)
-                # This fetches the GroupService -> Service details
-                .joinedload(GroupService.service)
-            )
-            .filter(Group.id == selected_option.id)
-            .one()
-        )
+        # Links come from the snapshot; the grid below reads only its current page.
+        group = session.get(Group, selected_option.id)
+        group_links = snapshot.links_by_group.get(group.id, ())
+        service_names = {svc.id: svc.name for svc in all_services}
 
         st.markdown("## Group Details")
 
@@ -521,7 +533,7 @@ def load_and_display_groups():
         label = f"{group.name}" if not cap else f"{group.name} | {cap}"
         # Removed expander for each group as only one is displayed
         st.caption(f"Group ID: {group.id} | Group Caption: {group.caption}")
-        any_enabled = any(gs.enabled for gs in group.group_services)
+        any_enabled = any(gs.enabled for gs in group_links)
         status_text = "Enabled" if any_enabled else "Disabled"
         bar_color = "16a34a" if any_enabled else "dc2626"  # green / red
 
@@ -565,20 +577,14 @@ def load_and_display_groups():
             with col_confirm:
                 if st.button("Yes, do it", key=f"yes_toggle_{group.id}"):
                     # --- EXECUTE LOGIC ---
-                    now = datetime.utcnow()
-                    for gs in group.group_services:
-                        gs.enabled = not any_enabled  # flip to opposite
-                        gs.status_changed_at = now
-
-                        # Optional: Send Discord notification if disabling
-                        if not gs.enabled and gs.webhook_url:
-                            send_discord_message(
-                                gs.webhook_url,
-                                f"Service Announcement\n\n🔕 Webhook disabled for **{gs.group.name} / {gs.service.name}**.\n\nPlease contact your provider (bennybags#0344) to re-enable services.",
-                                username="Webhook Manager"
-                            )
+                    # One UPDATE ... RETURNING flips every link (flip to opposite)
+                    group_name = group.name
+                    changed = set_links_enabled(session, not any_enabled, group_id=group.id)
 
-                    session.commit()
+                    # Optional: Send Discord notification if disabling (in the background)
+                    for link in changed:
+                        if not link.enabled and link.webhook_url:
+                            queue_notice(link.webhook_url, disabled_notice(group_name, service_names.get(link.service_id)))
 
                     # Cleanup state and refresh
                     st.session_state[confirm_key] = False
@@ -603,22 +609,14 @@ def load_and_display_groups():
 
         if mode == "All services":
             if st.button("Link all services", key=f"link_all_{group.id}"):
-                existing_ids = {gs.service_id for gs in group.group_services}
-                new_links = [
-                    GroupService(group_id=group.id, service_id=s.id, enabled=False)
-                    for s in all_services
-                    if s.id not in existing_ids
-                ]
-                if new_links:
-                    session.add_all(new_links)
-                    session.commit()
+                if link_services(session, group.id):
                     st.success("All services linked to this group.")
                     st.rerun()
                 else:
                     st.info("All services are already linked to this group.")
         else:
             # multi-select of services not yet linked
-            existing_ids = {gs.service_id for gs in group.group_services}
+            existing_ids = {gs.service_id for gs in group_links}
             available = [s for s in all_services if s.id not in existing_ids]
 
             selected = st.multiselect(
@@ -629,13 +627,7 @@ def load_and_display_groups():
             )
 
             if st.button("Add selected services", key=f"add_selected_{group.id}"):
-                new_links = [
-                    GroupService(group_id=group.id, service_id=s.id, enabled=False)
-                    for s in selected
-                ]
-                if new_links:
-                    session.add_all(new_links)
-                    session.commit()
+                if selected and link_services(session, group.id, [s.id for s in selected]):
                     st.success("Selected services linked.")
                     st.rerun()
                 else:
@@ -703,145 +695,93 @@ def load_and_display_groups():
         st.markdown(f"<h2 style='margin-bottom:0'>{group.name}</h2>", unsafe_allow_html=True)
         st.markdown("#### Services:")
 
-        # sort links for this group by service name (A→Z)
-        sorted_links = sorted(
-            group.group_services,
-            key=lambda gs: gs.service.name.lower()
-        )
-
-        # for gs in group.group_services:
-        for i, gs in enumerate(sorted_links):
-            # 4 columns: name | status | toggle | webhook update stuff
-            cols = st.columns([1, 1, 1, 3, 0.6])
-
-            #Service name
-            with cols[0]:
-                st.markdown(f"**{gs.service.name}**")
-                if gs.webhook_updated_at:
-                    st.markdown(
-                        f"<span style='font-size:13px;color:#999'>Last updated: "
-                        f"{gs.webhook_updated_at.strftime('%Y-%m-%d %H:%M:%S UTC')}</span>",
-                        unsafe_allow_html=True,
-                    )
-            #Enable Button
-            with cols[1]:
-                st.markdown("🟢" if gs.enabled else "🔴")
-                st.markdown("Enabled" if gs.enabled else "Disabled")
-                if gs.status_changed_at:
-                    st.markdown(
-                        f"<span style='font-size:11px;color:#999'>"
-                        f"Last change: {gs.status_changed_at.strftime('%Y-%m-%d %H:%M:%S')} UTC"
-                        f"</span>",
-                        unsafe_allow_html=True,
-                    )
-            #Disable Button
-            with cols[2]:
-                toggle_txt = "Disable" if gs.enabled else "Enable"
-                if st.button(toggle_txt, key=f"toggle_{group.id}_{gs.service.id}_{gs.enabled}"):
-                    gs.enabled = not gs.enabled
-                    gs.status_changed_at = datetime.utcnow()
-                    session.commit()
-                    st.rerun()
-            #Updating Section
-            with cols[3]:
-                st.markdown(
-                    f"<span style='font-size:13px;color:#666'>Webhook for <b>{gs.service.name}</b>:</span>",
-                    unsafe_allow_html=True,
-                )
-
-                pending_key = f"pending_webhook_{group.id}_{gs.service.id}"
-
-                confirm_key = f"confirm_clear_{group.id}_{gs.service.id}"
-
-                with st.form(key=f"webhook_form_{group.id}_{gs.service.id}"):
-                    updated_url = st.text_input(
-                        "Webhook URL",
-                        value=gs.webhook_url or "",
-                        label_visibility="collapsed",
-                        placeholder="https://discord.com/api/webhooks/...",
-                    )
-
-                    col_u, col_r = st.columns([2, 2])
-                    with col_u:
-                        update_clicked = st.form_submit_button("Update Webhook")
-                    with col_r:
-                        remove_clicked = st.form_submit_button("Remove webhook")
-
-                    # Handle update
-                    if update_clicked:
-                        st.session_state[pending_key] = updated_url
-
-                    # Handle remove with double confirmation
-                    if remove_clicked:
-                        if not st.session_state.get(confirm_key, False):
-                            st.session_state[confirm_key] = True
-                            st.warning("Click 'Remove webhook' again to confirm.")
-                        else:
-                            gs.webhook_url = None
-                            gs.health_status = "unconfigured"  # or your chosen state
-                            gs.webhook_updated_at = None
-                            session.commit()
-                            st.success("Webhook removed.")
-                            st.session_state[confirm_key] = False
-
-                # If there is a pending change, show confirmation UI
-                if pending_key in st.session_state and st.session_state[pending_key]:
-                    st.warning(
-                        f"Confirm changing webhook for {gs.service.name} to:\n"
-                        f"{st.session_state[pending_key]}"
-                    )
-                    c1, c2 = st.columns(2)
-                    with c1:
-                        if st.button("Confirm change", key=f"confirm_{group.id}_{gs.service.id}"):
-                            new_url = st.session_state[pending_key].strip()
-
-                            try:
-                                resp = requests.get(new_url, timeout=5)
-                                code = resp.status_code
-
-                                if 200 <= code < 300:
-                                    # valid -> save to DB and mark health
-                                    gs.webhook_url = new_url
-                                    gs.webhook_updated_at = datetime.utcnow()
-                                    gs.health_status = "ok"
-                                    gs.health_code = code
-                                    gs.health_checked_at = datetime.utcnow()
-
-                                    session.commit()
-                                    st.session_state[pending_key] = ""
-                                    st.success(f"Webhook updated and looks valid (HTTP {code}).")
-                                    st.rerun()
-                                elif code in (401, 404):
-                                    st.error(
-                                        f"Discord returned {code}: webhook appears invalid or deleted. Not saved.")
-                                else:
-                                    st.error(f"Discord returned HTTP {code}. Not saving this URL.")
-                            except Exception:
-                                st.error("Error reaching Discord; webhook not saved.")
-
-                    with c2:
-                        if st.button("Cancel", key=f"cancel_{group.id}_{gs.service.id}"):
-                            st.session_state[pending_key] = ""
-
-            # delete this service from this group
-            with cols[4]:
-                confirm_key = f"confirm_delete_link_{group.id}_{gs.service.id}"
-
-                if st.button("🗑️", key=f"delete_link_{group.id}_{gs.service.id}"):
-                    st.session_state[confirm_key] = True
+        # One editable grid instead of a block of widgets per link: the grid is
+        # virtualized in the browser, and only rows that changed come back.
+        if not group_links:
+            st.info("No services linked to this group yet.")
+        else:
+            search = st.text_input("Find service", key=f"svc_search_{group.id}", placeholder="Filter by name")
+            total = count_group_links(session, group.id, search)
+            pages = max(1, -(-total // DETAIL_PAGE_SIZE))
+            page = 1
+            if pages > 1:
+                page = st.number_input(f"Page (of {pages})", 1, pages, 1, key=f"svc_page_{group.id}")
+            page_links = load_group_links_page(session, group.id, search, page)
+
+            original = pd.DataFrame(
+                [
+                    {
+                        "id": link_id,
+                        "Service": service_name,
+                        "Enabled": bool(enabled),
+                        "Webhook URL": webhook_url or "",
+                        "Health": health_status or "unknown",
+                        "Last change": status_changed_at,
+                        "Webhook updated": webhook_updated_at,
+                        "Remove": False,
+                    }
+                    for link_id, service_name, enabled, webhook_url, health_status, status_changed_at, webhook_updated_at
+                    in page_links
+                ],
+                columns=["id", "Service", "Enabled", "Webhook URL", "Health", "Last change", "Webhook updated", "Remove"],
+            ).set_index("id")
+
+            # Bumped after every save so the grid starts from the fresh DB state
+            rev_key = f"svc_grid_rev_{group.id}"
+            rev = st.session_state.get(rev_key, 0)
+            edited = st.data_editor(
+                original,
+                key=f"svc_grid_{group.id}_{page}_{rev}",
+                use_container_width=True,
+                hide_index=True,
+                disabled=["Service", "Health", "Last change", "Webhook updated"],
+                column_config={
+                    "Enabled": st.column_config.CheckboxColumn("Enabled"),
+                    "Webhook URL": st.column_config.TextColumn(
+                        "Webhook URL", width="large", help="Empty = remove the webhook; new URLs are checked with Discord before saving"
+                    ),
+                    "Last change": st.column_config.DatetimeColumn("Last change (UTC)", format="YYYY-MM-DD HH:mm"),
+                    "Webhook updated": st.column_config.DatetimeColumn("Webhook updated (UTC)", format="YYYY-MM-DD HH:mm"),
+                    "Remove": st.column_config.CheckboxColumn("Remove", help="Unlink this service from the group"),
+                },
+            )
 
-            if st.session_state.get(confirm_key):
-                st.warning("Remove this service from this group?")
-                c1, c2 = st.columns(2)
-                with c1:
-                    if st.button("Yes, delete", key=f"yes_{confirm_key}"):
-                        session.delete(gs)
-                        session.commit()
-                        st.session_state[confirm_key] = False
+            # Diff the grid against what was loaded: only changed rows are written
+            enabled_changed = edited["Enabled"] != original["Enabled"]
+            url_changed = edited["Webhook URL"].fillna("").str.strip() != original["Webhook URL"]
+            removals = edited.index[edited["Remove"]].tolist()
+            edits = {}
+            for link_id in edited.index[enabled_changed & ~edited["Remove"]]:
+                edits.setdefault(int(link_id), {})["enabled"] = bool(edited.at[link_id, "Enabled"])
+            for link_id in edited.index[url_changed & ~edited["Remove"]]:
+                edits.setdefault(int(link_id), {})["webhook_url"] = (edited.at[link_id, "Webhook URL"] or "").strip()
+
+            if edits or removals:
+                summary = []
+                if enabled_changed.any():
+                    summary.append(f"{int(enabled_changed.sum())} toggled")
+                if url_changed.any():
+                    summary.append(f"{int(url_changed.sum())} webhook(s) changed")
+                if removals:
+                    summary.append(f"**{len(removals)} to remove**")
+                st.warning("Pending: " + ", ".join(summary))
+
+                c_save, c_discard, _ = st.columns([1, 1, 4])
+                with c_save:
+                    if st.button("Save changes", key=f"save_grid_{group.id}", type="primary"):
+                        with st.spinner("Saving..."):
+                            saved, rejected = save_link_edits(session, edits)
+                            removed = delete_links(session, removals)
+                        for link_id, reason in rejected.items():
+                            st.error(f"{original.at[link_id, 'Service']}: {reason}. Not saved.")
+                        st.session_state[rev_key] = rev + 1
+                        if not rejected:
+                            st.toast(f"Saved {saved} link(s), removed {removed}.")
+                            st.rerun()
+                with c_discard:
+                    if st.button("Discard", key=f"discard_grid_{group.id}"):
+                        st.session_state[rev_key] = rev + 1
                         st.rerun()
-                with c2:
-                    if st.button("Cancel", key=f"no_{confirm_key}"):
-                        st.session_state[confirm_key] = False
 
     # Add the "Back to Top" button at the end of the page rendering
     st.markdown("""
@@ -881,8 +821,7 @@ def load_and_display_groups():
 # broken url = 'https://discord.com/api/webhooks/1444080766140022814/pEKP8d0-Vh1zydGTl9Idz375b8D1hpDgzFyv6x9lHX4I2_m072FQLBKIpruz46FrMTKS'
 
 if __name__ == "__main__":
-    try:
-        load_and_display_groups()
-    finally:
-        # Crucial: Always close the connection when the script finishes rendering
-        session.close()
\ No newline at end of file
+    # One session per rerun; closed (and its connection returned to the pool)
+    # however the run ends, including st.rerun()
+    with session_scope() as session:
+        load_and_display_groups(session)
\ No newline at end of file
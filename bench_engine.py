@@ -0,0 +1,115 @@
+"""
+Concurrent throughput of a default create_engine() vs the tuned db.make_engine()
+profile: reader threads run the Home.py style reads while writer threads flip
+links, the way the Streamlit app, health worker and receiver overlap in prod.
+
+    python bench_engine.py                        # throwaway SQLite file
+    BENCH_DATABASE_URL=postgresql://... python bench_engine.py --readers 16
+
+Creates its own tables in BENCH_DATABASE_URL; never point it at the app database.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, insert, select, update
+from sqlalchemy.orm import sessionmaker
+
+from db import make_engine
+from models import Base, Group, GroupService, Service
+
+
+def seed(engine, groups=200, services=50):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Service), [{"id": s + 1, "name": f"svc{s}"} for s in range(services)])
+        conn.execute(insert(Group), [{"id": g + 1, "name": f"group{g}"} for g in range(groups)])
+        conn.execute(insert(GroupService), [
+            {"group_id": g + 1, "service_id": s + 1, "enabled": True, "webhook_url": f"https://x/{g}/{s}"}
+            for g in range(groups) for s in range(services)
+        ])
+    return groups, services
+
+
+def read_once(session, rnd, groups):
+    group_id = rnd.randint(1, groups)
+    session.execute(select(GroupService.id, GroupService.enabled).where(GroupService.group_id == group_id)).all()
+    session.execute(
+        select(Service.name, func.count(GroupService.id))
+        .join(GroupService, GroupService.service_id == Service.id)
+        .group_by(Service.name)
+    ).all()
+
+
+def write_once(session, rnd, groups):
+    session.execute(
+        update(GroupService)
+        .where(GroupService.group_id == rnd.randint(1, groups))
+        .values(enabled=rnd.random() < 0.5, status_changed_at=datetime.utcnow())
+    )
+    session.commit()
+
+
+def run(engine, label, readers, writers, seconds, groups):
+    Session = sessionmaker(bind=engine)
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def worker(op, key, seed_value):
+        rnd = random.Random(seed_value)
+        done = errors = 0
+        while time.monotonic() < stop:
+            session = Session()
+            try:
+                op(session, rnd, groups)
+                done += 1
+            except Exception:
+                session.rollback()
+                errors += 1
+            finally:
+                session.close()
+        with lock:
+            counts[key] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=worker, args=(read_once, "reads", i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=(write_once, "writes", 1000 + i)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    print(
+        f"{label:<10} reads/s {counts['reads'] / seconds:8.1f}   writes/s {counts['writes'] / seconds:7.1f}"
+        f"   errors {counts['errors']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--profile", default="web")
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    default = create_engine(url, future=True)
+    groups, _ = seed(default)
+    print(f"{args.readers} readers + {args.writers} writers for {args.seconds:.0f}s on {default.url.render_as_string(hide_password=True)}")
+    run(default, "default", args.readers, args.writers, args.seconds, groups)
+
+    tuned = make_engine(url, args.profile)
+    seed(tuned)
+    run(tuned, args.profile, args.readers, args.writers, args.seconds, groups)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Query plans and timings for the group_services queries the app runs, with and
+without the indexes declared in models.py. Each entry calls the real function
+(health scan, scan job, Raw List) and explains the SQL it actually sent.
+
+    python bench_indexes.py                      # throwaway SQLite file
+    BENCH_DATABASE_URL=postgresql://... python bench_indexes.py --links 100000
+
+Builds its own tables in BENCH_DATABASE_URL (never the app database), so
+point it at an empty scratch database.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert, select, text
+from sqlalchemy.orm import Session
+
+from check_webhooks import load_due_urls, load_url_index
+from matrix_data import LinkFilter, count_links, fetch_links_page
+from models import Base, Group, GroupService, Service
+from scan_jobs import load_link_labels
+
+NEW_INDEXES = [i for i in GroupService.__table__.indexes if i.name != "uq_group_services_group_service"]
+
+
+def seed(engine, links, services=50):
+    groups = links // services
+    now = datetime.utcnow()
+    rnd = random.Random(42)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Service), [{"id": s + 1, "name": f"svc{s}"} for s in range(services)])
+        conn.execute(insert(Group), [
+            {"id": g + 1, "name": f"group{g}", "webhook_url": f"https://discord.com/api/webhooks/{g}/group"}
+            for g in range(groups)
+        ])
+        rows = []
+        for g in range(groups):
+            for s in range(services):
+                enabled = rnd.random() < 0.3        # most links are onboarded disabled
+                rows.append({
+                    "group_id": g + 1,
+                    "service_id": s + 1,
+                    "enabled": enabled,
+                    "webhook_url": f"https://discord.com/api/webhooks/{g}{s}/x" if rnd.random() < 0.5 else None,
+                    "health_status": rnd.choices(["ok", "unknown", "missing", "error"], [90, 6, 2, 2])[0],
+                    "health_checked_at": now - timedelta(seconds=rnd.randint(0, 86400)),
+                })
+            if len(rows) >= 10000:
+                conn.execute(insert(GroupService), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(GroupService), rows)
+
+
+BROKEN = LinkFilter(health=("missing", "error"))
+
+QUERIES = {
+    "health worker (check_webhooks.load_due_urls)": load_due_urls,
+    "manual scan targets (check_webhooks.load_url_index)": load_url_index,
+    "manual scan results (scan_jobs.load_link_labels)": load_link_labels,
+    "Raw List, broken filter (matrix_data.count_links)": lambda session: count_links(session, BROKEN),
+    "Raw List, broken filter (matrix_data.fetch_links_page)": lambda session: fetch_links_page(session, BROKEN),
+    "Raw List, page after id 50000": lambda session: fetch_links_page(session, LinkFilter(), after_id=50000),
+    "links of one service (toggle / overview)": lambda session: session.execute(
+        select(GroupService.id, GroupService.enabled).where(GroupService.service_id == 7)
+    ).all(),
+}
+
+
+def captured_sql(engine, fn):
+    """Run `fn` once and return the (sql, parameters) it sent."""
+    sent = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        sent.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as session:
+            fn(session)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return sent
+
+
+def explain(engine, fn):
+    lines = []
+    with engine.connect() as conn:
+        for statement, parameters in captured_sql(engine, fn):
+            if conn.dialect.name == "sqlite":
+                rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                lines += [f"    {row[-1]}" for row in rows]
+            else:
+                rows = conn.exec_driver_sql(f"EXPLAIN ANALYZE {statement}", parameters).all()
+                lines += [f"    {row[0]}" for row in rows]
+    return "\n".join(lines)
+
+
+def timed(engine, fn, repeat):
+    best = float("inf")
+    with Session(engine) as session:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(session)
+            best = min(best, time.perf_counter() - start)
+            session.rollback()
+    return best * 1000
+
+
+def run(engine, label, repeat):
+    print(f"\n===== {label} =====")
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE group_services" if conn.dialect.name == "postgresql" else "ANALYZE"))
+    for name, fn in QUERIES.items():
+        print(f"\n-- {name}: {timed(engine, fn, repeat):.1f} ms (best of {repeat})")
+        print(explain(engine, fn))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--links", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url, future=True)
+    print(f"Seeding {args.links} links into {engine.url.render_as_string(hide_password=True)}")
+    seed(engine, args.links)
+
+    for index in NEW_INDEXES:
+        index.drop(bind=engine)
+    run(engine, "before (service_id index dropped)", args.repeat)
+
+    for index in NEW_INDEXES:
+        index.create(bind=engine)
+    run(engine, "after", args.repeat)
+
+
+if __name__ == "__main__":
+    main()
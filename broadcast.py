@@ -0,0 +1,162 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+
+from db import SessionLocal
+from coalesce import Coalescer
+from discord_dispatch import DeliveryResult, get_dispatcher
+from embed_templates import group_template
+from http_pool import new_async_client
+from models import Group, GroupService, Service
+
+CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "50"))   # sends in flight at once
+TIMEOUT = 10
+
+
+@dataclass(frozen=True)
+class BroadcastTarget:
+    link_id: int
+    webhook_url: str
+    service_name: str
+    group_id: int
+    group_name: str
+    group_updated_at: Optional[datetime]
+    color: Optional[str]
+    footer: Optional[str]
+    footer_img: Optional[str]
+
+
+@dataclass
+class BroadcastResult:
+    target: BroadcastTarget
+    delivery: DeliveryResult
+
+
+def load_targets(session, service_name=None):
+    """
+    Every enabled link for `service_name` (or all services if None), resolved to
+    the URL a send should use, with the group fields embeds need. One joined query.
+    """
+    stmt = (
+        select(
+            GroupService.id,
+            GroupService.webhook_url,
+            Service.name,
+            Group.id,
+            Group.name,
+            Group.updated_at,
+            Group.webhook_url,
+            Group.color,
+            Group.webhook_footer,
+            Group.webhook_footer_img,
+        )
+        .join(Group, GroupService.group_id == Group.id)
+        .join(Service, GroupService.service_id == Service.id)
+        .where(GroupService.enabled == True)
+    )
+    if service_name is not None:
+        stmt = stmt.where(Service.name == service_name)
+
+    targets = []
+    for link_id, link_url, svc_name, group_id, group_name, group_updated, group_url, color, footer, footer_img in session.execute(stmt):
+        # Prefer per-service webhook; fall back to group webhook if None
+        url = link_url or group_url
+        if not url:
+            continue  # nothing to send to
+        targets.append(BroadcastTarget(link_id, url, svc_name, group_id, group_name, group_updated, color, footer, footer_img))
+    return targets
+
+
+def target_template(target):
+    """The group's compiled template (color, footer, username) for this service."""
+    return group_template(
+        target.service_name, target.group_id, target.group_updated_at,
+        target.group_name, target.color, target.footer, target.footer_img,
+    )
+
+
+def build_payload(target, embed):
+    """Per-event embed fields spliced into the group's template. Returns JSON bytes ready to post."""
+    return target_template(target).render_bytes(**embed)
+
+
+async def _submit(coalescer, target, build_embed):
+    """Queue one target's embed on a Coalescer; resolves when its message was sent."""
+    try:
+        template = target_template(target)
+        rendered = template.render_embed(**build_embed())
+    except Exception as e:
+        return BroadcastResult(target, DeliveryResult(url=target.webhook_url, ok=False, error=f"embed: {e}"))
+    return BroadcastResult(target, await coalescer.submit(target.webhook_url, template, rendered))
+
+
+async def abroadcast(service_name, embed_builder, concurrency=CONCURRENCY, coalescer=None):
+    """
+    Send one embed per target concurrently over a pooled client.
+    `embed_builder(target)` returns the embed dict for that group (title,
+    description, fields...). Returns a BroadcastResult per target.
+
+    Optional coalescing stage: pass a Coalescer shared by concurrent broadcasts
+    (e.g. one per scraped item) and embeds for the same webhook that arrive
+    within its window go out together as multi-embed messages.
+    """
+    session = SessionLocal()
+    try:
+        targets = load_targets(session, service_name)
+    finally:
+        session.close()
+    if not targets:
+        return []
+    if coalescer is not None:
+        # The coalescer holds the client and bounds its own sends
+        return await asyncio.gather(*(_submit(coalescer, t, lambda t=t: embed_builder(t)) for t in targets))
+
+    dispatcher = get_dispatcher()
+    sem = asyncio.Semaphore(concurrency)
+    async with new_async_client(timeout=TIMEOUT, max_connections=concurrency, max_keepalive=concurrency) as client:
+        async def send_one(target):
+            async with sem:
+                try:
+                    payload = build_payload(target, embed_builder(target))
+                except Exception as e:
+                    return BroadcastResult(target, DeliveryResult(url=target.webhook_url, ok=False, error=f"embed: {e}"))
+                return BroadcastResult(target, await dispatcher.asend(target.webhook_url, payload, client))
+
+        return await asyncio.gather(*(send_one(t) for t in targets))
+
+
+def broadcast(service_name, embed_builder, concurrency=CONCURRENCY):
+    """Blocking wrapper around abroadcast for scripts and Streamlit."""
+    return asyncio.run(abroadcast(service_name, embed_builder, concurrency))
+
+
+async def abroadcast_many(service_name, items, embed_builder, concurrency=CONCURRENCY):
+    """
+    Burst variant: send every item to every target, coalescing the embeds for
+    each webhook into multi-embed messages (up to 10 per request).
+    `embed_builder(target, item)` returns the embed dict. Returns one
+    BroadcastResult per (target, item), in that order.
+    """
+    session = SessionLocal()
+    try:
+        targets = load_targets(session, service_name)
+    finally:
+        session.close()
+    if not targets or not items:
+        return []
+
+    async with new_async_client(timeout=TIMEOUT, max_connections=concurrency, max_keepalive=concurrency) as client:
+        async with Coalescer(client, concurrency=concurrency) as coalescer:
+            return await asyncio.gather(*(
+                _submit(coalescer, t, lambda t=t, item=item: embed_builder(t, item))
+                for t in targets for item in items
+            ))
+
+
+def broadcast_many(service_name, items, embed_builder, concurrency=CONCURRENCY):
+    """Blocking wrapper around abroadcast_many."""
+    return asyncio.run(abroadcast_many(service_name, items, embed_builder, concurrency))
@@ -1,39 +1,275 @@
-import requests
-from datetime import datetime
-from db import SessionLocal, engine
-from models import GroupService
+import asyncio
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+if __name__ == "__main__":
+    os.environ.setdefault("DB_PROFILE", "worker")   # pool sizing / timeouts, see db.py
+
+from sqlalchemy import String, bindparam, case, func, select, update
+
+from db import engine, read_session, session_scope
+from http_pool import get_client, new_async_client
+from models import Group, GroupService
 
 TIMEOUT = 5
 
+# Probe engine tuning (override via environment on Render / locally)
+CONCURRENCY = int(os.getenv("HEALTH_CONCURRENCY", "100"))      # probes in flight overall
+PER_HOST_LIMIT = int(os.getenv("HEALTH_PER_HOST", "50"))       # probes in flight per host (discord.com)
+SCAN_DEADLINE = float(os.getenv("HEALTH_SCAN_DEADLINE", "60"))  # seconds for the whole scan
+WRITE_CHUNK = int(os.getenv("HEALTH_WRITE_CHUNK", "1000"))      # rows per batched UPDATE
+CANCEL_POLL = 0.25                                              # seconds between checks of a cancel flag
+
+# Incremental scheduling (seconds)
+OK_TTL = float(os.getenv("HEALTH_OK_TTL", str(6 * 3600)))           # re-check healthy/missing links this often
+ERROR_RETRY = float(os.getenv("HEALTH_ERROR_RETRY", "300"))         # first retry after an error...
+ERROR_RETRY_MAX = float(os.getenv("HEALTH_ERROR_RETRY_MAX", "3600"))  # ...doubling up to this
+WORKER_TICK = float(os.getenv("HEALTH_WORKER_TICK", "30"))          # worker wakes up this often
+WORKER_MIN_BATCH = int(os.getenv("HEALTH_WORKER_MIN_BATCH", "10"))  # probes allowed per tick, at least
+
+
+def classify_status(code):
+    if 200 <= code < 300:
+        return "ok"
+    if code == 404 or code == 401:
+        return "missing"   # likely deleted or invalid
+    return "error"
+
+
+def probe_url(url):
+    """Blocking single probe over the process-wide pooled client (keeps TLS warm across Streamlit saves)."""
+    try:
+        resp = get_client().get(url, timeout=TIMEOUT)
+        return classify_status(resp.status_code), resp.status_code, datetime.utcnow()
+    except Exception:
+        return "error", None, datetime.utcnow()
+
+
+async def _probe(client, url, global_sem, host_sems, per_host):
+    host = urlsplit(url).netloc.lower()
+    host_sem = host_sems.get(host)
+    if host_sem is None:
+        host_sem = host_sems[host] = asyncio.Semaphore(per_host)
+
+    # Host slot first: tasks queued behind one busy host must not sit on global
+    # slots that probes to every other host could be using
+    async with host_sem, global_sem:
+        try:
+            # Discord treats simple POSTs; a HEAD/GET will still give a useful status
+            resp = await client.get(url)
+            status, code = classify_status(resp.status_code), resp.status_code
+        except Exception:
+            status, code = "error", None
+    return status, code, datetime.utcnow()
+
+
+async def probe_urls(targets, concurrency=CONCURRENCY, per_host=PER_HOST_LIMIT, deadline=SCAN_DEADLINE,
+                     on_result=None, cancel=None):
+    """
+    Probe many webhook URLs concurrently over one pooled client.
+    `targets` maps any key -> url. Returns {key: (health_status, health_code, checked_at)}
+    for every probe that finished before the deadline; the rest are left out.
+    `on_result(key, result)` is called as each probe finishes (progress), and
+    setting the `cancel` threading.Event stops the scan early like the deadline does.
+    """
+    if not targets:
+        return {}
+
+    global_sem = asyncio.Semaphore(concurrency)
+    host_sems = {}
+    results = {}
+
+    def report(task):
+        if not task.cancelled():
+            on_result(tasks[task], task.result())
+
+    async with new_async_client(timeout=TIMEOUT, max_connections=concurrency, max_keepalive=concurrency) as client:
+        tasks = {
+            asyncio.create_task(_probe(client, url, global_sem, host_sems, per_host)): key
+            for key, url in targets.items()
+        }
+        if on_result is not None:
+            for task in tasks:
+                task.add_done_callback(report)
+
+        loop = asyncio.get_running_loop()
+        stop_at = loop.time() + deadline
+        pending = set(tasks)
+        while pending:
+            remaining = stop_at - loop.time()
+            if remaining <= 0 or (cancel is not None and cancel.is_set()):
+                break
+            # With a cancel flag, wake up regularly to look at it
+            _, pending = await asyncio.wait(pending, timeout=min(remaining, CANCEL_POLL) if cancel is not None else remaining)
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    for task, key in tasks.items():
+        if task.done() and not task.cancelled():
+            results[key] = task.result()
+    return results
+
+
+def build_url_index(rows):
+    """
+    Group link ids by the URL a send would actually use: the per-service webhook,
+    falling back to the group webhook (same rule as test_message.send_message_db).
+    `rows` are (link_id, link_webhook_url, group_webhook_url) tuples.
+    Returns {url: [link_id, ...]}; links with no usable URL are skipped.
+    """
+    index = {}
+    for link_id, link_url, group_url in rows:
+        url = link_url or group_url
+        if not url:
+            continue
+        index.setdefault(url.strip(), []).append(link_id)
+    return index
+
+
+def load_url_index(session):
+    # Narrow projection: no ORM entities, just the columns needed to resolve URLs
+    rows = session.execute(
+        select(GroupService.id, GroupService.webhook_url, Group.webhook_url)
+        .outerjoin(Group, GroupService.group_id == Group.id)
+        .where(GroupService.enabled == True)
+    )
+    return build_url_index(rows)
+
+
+_links = GroupService.__table__
+
+# One statement, executemany'd by link id. health_failures counts consecutive
+# "error" results in the database, so the backoff survives worker restarts.
+_write_health = (
+    update(_links)
+    .where(_links.c.id == bindparam("link_id"))
+    .values(
+        health_status=bindparam("status", type_=String),
+        health_code=bindparam("code"),
+        health_checked_at=bindparam("checked_at"),
+        health_failures=case(
+            (bindparam("status", type_=String) == "error", func.coalesce(_links.c.health_failures, 0) + 1),
+            else_=0,
+        ),
+    )
+)
+
+
+def write_health_results(session, url_index, results, chunk_size=WRITE_CHUNK):
+    """
+    Persist probe results with one executemany UPDATE (by primary key) per chunk
+    instead of a unit-of-work flush per row. Returns the number of rows written.
+    """
+    params = [
+        {"link_id": link_id, "status": status, "code": code, "checked_at": checked_at}
+        for url, (status, code, checked_at) in results.items()
+        for link_id in url_index[url]
+    ]
+    for start in range(0, len(params), chunk_size):
+        session.execute(_write_health, params[start:start + chunk_size])
+    session.commit()
+    return len(params)
+
+
 def check_all_webhooks():
-    session = SessionLocal()
     # print(f"Connecting to Database URL: {engine.url}")
-    try:
-        links = session.query(GroupService).filter(GroupService.webhook_url != None, GroupService.enabled == True).all()
-        for gs in links:
-            url = gs.webhook_url
-            if gs.enabled:
-                try:
-                    # Discord treats simple POSTs; a HEAD/GET will still give a useful status
-                    resp = requests.get(url, timeout=TIMEOUT)
-
-                    gs.health_code = resp.status_code
-                    if 200 <= resp.status_code < 300:
-
-                        gs.health_status = "ok"
-                    elif resp.status_code == 404 or resp.status_code == 401:
-                        gs.health_status = "missing"   # likely deleted or invalid
-                    else:
-                        gs.health_status = "error"
-
-                    # print(url, gs.health_status)
-                except Exception:
-                    gs.health_status = "error"
-                    gs.health_code = None
-                gs.health_checked_at = datetime.utcnow()
-        session.commit()
-    finally:
-        session.close()
+    # No connection is held while probing: read, release, probe, then write
+    with read_session() as session:
+        url_index = load_url_index(session)
+
+    # One probe per distinct endpoint, fanned out to every link that uses it.
+    # URLs that did not finish before the scan deadline keep their previous health.
+    results = asyncio.run(probe_urls({url: url for url in url_index}))
+    with session_scope() as session:
+        write_health_results(session, url_index, results)
+
+
+def retry_interval(status, failures=0):
+    """Seconds to wait after a check before the URL is due again."""
+    if status in ("ok", "missing"):
+        return OK_TTL
+    if status == "error":
+        return min(ERROR_RETRY * (2 ** failures), ERROR_RETRY_MAX)
+    return 0  # unknown / unconfigured / never checked: due now
+
+
+def load_due_urls(session, now=None):
+    """
+    Resolve enabled links to URLs and keep only the ones whose last check is older
+    than their retry interval. Returns (url_index, due) where `due` is a list of
+    (due_at, url) sorted oldest first.
+    """
+    now = now or datetime.utcnow()
+    rows = session.execute(
+        select(
+            GroupService.id,
+            GroupService.webhook_url,
+            Group.webhook_url,
+            GroupService.health_status,
+            GroupService.health_checked_at,
+            GroupService.health_failures,
+        )
+        .outerjoin(Group, GroupService.group_id == Group.id)
+        .where(GroupService.enabled == True)
+    ).all()
+
+    url_index = build_url_index((r[0], r[1], r[2]) for r in rows)
+
+    # A URL is due as soon as any of the links using it is due
+    due_at = {}
+    for link_id, link_url, group_url, status, checked_at, failures in rows:
+        url = (link_url or group_url or "").strip()
+        if not url:
+            continue
+        if checked_at is None:
+            when = datetime.min
+        else:
+            # health_failures counts the last error too: the first retry waits ERROR_RETRY
+            streak = max((failures or 1) - 1, 0)
+            when = checked_at + timedelta(seconds=retry_interval(status, streak))
+        if url not in due_at or when < due_at[url]:
+            due_at[url] = when
+
+    due = sorted((when, url) for url, when in due_at.items() if when <= now)
+    return url_index, due
+
+
+def run_health_worker(tick=WORKER_TICK):
+    """
+    Long-lived background checker. Every tick it probes a slice of the due URLs
+    sized so the whole set is covered once per OK_TTL, which spreads probes
+    evenly instead of bursting. Error streaks are stored per link
+    (health_failures), so the backoff carries over a restart.
+    """
+    while True:
+        started = time.monotonic()
+        try:
+            with read_session() as session:
+                url_index, due = load_due_urls(session)
+            budget = max(WORKER_MIN_BATCH, math.ceil(len(url_index) * tick / OK_TTL))
+            batch = due[:budget]
+            results = asyncio.run(probe_urls({url: url for _, url in batch}))
+            with session_scope() as session:
+                write_health_results(session, url_index, results)
+
+            print(f"Health worker: probed {len(results)}/{len(due)} due of {len(url_index)} URLs")
+        except Exception as e:
+            print(f"Health worker pass failed: {e}")
+
+        time.sleep(max(0.0, tick - (time.monotonic() - started)))
+
 
 if __name__ == "__main__":
-    check_all_webhooks()
+    # python check_webhooks.py           -> one full scan
+    # python check_webhooks.py --worker  -> long-running incremental scheduler
+    if "--worker" in sys.argv:
+        run_health_worker()
+    else:
+        check_all_webhooks()
@@ -0,0 +1,129 @@
+import asyncio
+import os
+
+from discord_dispatch import DeliveryResult, get_dispatcher
+
+# Discord limits per message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+
+WINDOW = float(os.getenv("COALESCE_WINDOW", "0.25"))        # wait this long for more embeds...
+MAX_LATENCY = float(os.getenv("COALESCE_MAX_LATENCY", "1"))  # ...but never hold one longer than this
+
+
+def embed_chars(embed):
+    """Characters Discord counts towards the 6000 per-message embed budget."""
+    total = len(embed.get("title") or "") + len(embed.get("description") or "")
+    total += len((embed.get("footer") or {}).get("text") or "")
+    total += len((embed.get("author") or {}).get("name") or "")
+    for field in embed.get("fields") or []:
+        total += len(str(field.get("name") or "")) + len(str(field.get("value") or ""))
+    return total
+
+
+def pack_embeds(embeds):
+    """Split embeds into message-sized chunks (<= 10 embeds, <= 6000 chars each)."""
+    chunk, chars = [], 0
+    for embed in embeds:
+        size = embed_chars(embed)
+        if chunk and (len(chunk) >= MAX_EMBEDS or chars + size > MAX_EMBED_CHARS):
+            yield chunk
+            chunk, chars = [], 0
+        chunk.append(embed)
+        chars += size
+    if chunk:
+        yield chunk
+
+
+class Coalescer:
+    """
+    Buffers embeds headed for the same webhook and sends them as multi-embed
+    messages. A buffer is flushed when it is full, when no new embed arrived for
+    `window` seconds, or `max_latency` after its first embed, whichever is first.
+
+        async with Coalescer(client) as co:
+            result = await co.submit(url, template, template.render_embed(title=...))
+    """
+
+    def __init__(self, client=None, window=WINDOW, max_latency=MAX_LATENCY, concurrency=50, dispatcher=None):
+        self.client = client
+        self.window = window
+        self.max_latency = max_latency
+        self.dispatcher = dispatcher or get_dispatcher()
+        self._buffers = {}    # (url, template id) -> {"template", "items": [(embed, future)], "chars", "timer"}
+        self._inflight = set()
+        self._send_slots = asyncio.Semaphore(concurrency)   # messages in flight at once
+        self.stats = {"embeds": 0, "messages": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.flush_all()
+
+    async def submit(self, url, template, embed):
+        """Queue one embed; resolves to the DeliveryResult of the message it went out in."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (url, id(template))
+        size = embed_chars(embed)
+        self.stats["embeds"] += 1
+
+        buf = self._buffers.get(key)
+        if buf is not None and (len(buf["items"]) >= MAX_EMBEDS or buf["chars"] + size > MAX_EMBED_CHARS):
+            self._start_flush(key)
+            buf = None
+        if buf is None:
+            buf = self._buffers[key] = {
+                "template": template,
+                "items": [],
+                "chars": 0,
+                "deadline": loop.time() + self.max_latency,
+                "last": loop.time(),
+            }
+            buf["timer"] = asyncio.create_task(self._timer(key, buf))
+
+        buf["items"].append((embed, future))
+        buf["chars"] += size
+        buf["last"] = loop.time()
+        if len(buf["items"]) >= MAX_EMBEDS:
+            self._start_flush(key)
+        return await future
+
+    async def _timer(self, key, buf):
+        loop = asyncio.get_running_loop()
+        while self._buffers.get(key) is buf:
+            wake = min(buf["last"] + self.window, buf["deadline"])
+            if loop.time() >= wake:
+                self._start_flush(key)
+                return
+            await asyncio.sleep(wake - loop.time())
+
+    def _start_flush(self, key):
+        buf = self._buffers.pop(key, None)
+        if buf is not None:
+            task = asyncio.create_task(self._send(key[0], buf))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, url, buf):
+        items = buf["items"]
+        try:
+            payload = buf["template"].pack(embed for embed, _ in items)
+            async with self._send_slots:
+                result = await self.dispatcher.asend(url, payload, self.client)
+        except Exception as e:
+            result = DeliveryResult(url=url, ok=False, error=str(e))
+        self.stats["messages"] += 1
+        for _, future in items:
+            if not future.done():
+                future.set_result(result)
+
+    async def flush_all(self):
+        """Send everything still buffered and wait for it."""
+        pending = []
+        for key in list(self._buffers):
+            buf = self._buffers.pop(key)
+            buf["timer"].cancel()
+            pending.append(self._send(key[0], buf))
+        await asyncio.gather(*pending, *list(self._inflight))
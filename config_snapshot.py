@@ -0,0 +1,199 @@
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event, func, select
+
+from db import SessionLocal
+from models import Group, GroupService, Service
+
+# How often (seconds) to ask the DB whether someone outside this process changed the config
+PROBE_INTERVAL = float(os.getenv("SNAPSHOT_PROBE_SECONDS", "10"))
+
+CONFIG_MODELS = (Group, Service, GroupService)
+CONFIG_TABLES = {model.__tablename__ for model in CONFIG_MODELS}
+
+# group_services columns the snapshot holds; health write-backs touch none of them
+LINK_CONFIG_COLUMNS = {"group_id", "service_id", "enabled", "webhook_url"}
+
+
+@dataclass(frozen=True, slots=True)
+class GroupRec:
+    id: int
+    name: str
+    caption: Optional[str]
+    color: Optional[str]
+    webhook_footer: Optional[str]
+    webhook_footer_img: Optional[str]
+    webhook_url: Optional[str]
+    enabled: bool
+    updated_at: Optional[datetime]
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceRec:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class LinkRec:
+    id: int
+    group_id: int
+    service_id: int
+    enabled: bool
+    webhook_url: Optional[str]
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Immutable, read-only view of groups, services and links for rendering."""
+    version: tuple
+    groups: tuple            # sorted by name
+    services: tuple          # sorted by name, case-insensitive
+    links: tuple
+    links_by_service: dict   # service_id -> tuple[LinkRec]
+    links_by_group: dict     # group_id -> tuple[LinkRec]
+
+
+# --- Write tracking -------------------------------------------------------
+# Every commit through SessionLocal that touched a config table bumps this
+# counter, so the snapshot is rebuilt on the next rerun after an app write.
+
+_write_version = itertools.count(1)
+_current_version = 0
+_version_lock = threading.Lock()
+
+
+def mark_config_changed():
+    global _current_version
+    with _version_lock:
+        _current_version = next(_write_version)
+
+
+def write_version():
+    return _current_version
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_flush(session, flush_context):
+    if any(isinstance(obj, CONFIG_MODELS) for obj in itertools.chain(session.new, session.dirty, session.deleted)):
+        session.info["config_dirty"] = True
+
+
+def _updated_columns(state):
+    """Column names an UPDATE sets, from .values() and from executemany/bulk parameters."""
+    names = {getattr(key, "key", key) for key in (getattr(state.statement, "_values", None) or {})}
+    params = state.parameters
+    for row in (params if isinstance(params, list) else [params or {}]):
+        names.update(row)
+    return names
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    # Bulk UPDATE/INSERT/DELETE statements skip the flush
+    state = orm_execute_state
+    if not (state.is_update or state.is_delete or state.is_insert):
+        return
+    table = getattr(state.statement, "table", None)
+    if table is None or table.name not in CONFIG_TABLES:
+        return
+    if state.is_update and table.name == GroupService.__tablename__ and not (_updated_columns(state) & LINK_CONFIG_COLUMNS):
+        return     # health_* write-back from a scan or the worker
+    state.session.info["config_dirty"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _track_commit(session):
+    if session.info.pop("config_dirty", False):
+        mark_config_changed()
+
+
+# --- Loading --------------------------------------------------------------
+
+def config_fingerprint(session):
+    """One cheap aggregate query that changes whenever groups/services/links change."""
+    return tuple(session.execute(
+        select(
+            select(func.count(Group.id)).scalar_subquery(),
+            select(func.max(Group.updated_at)).scalar_subquery(),
+            select(func.count(Service.id)).scalar_subquery(),
+            select(func.max(Service.id)).scalar_subquery(),
+            func.count(GroupService.id),
+            func.max(GroupService.id),
+            func.max(GroupService.webhook_updated_at),
+            func.max(GroupService.status_changed_at),
+        )
+    ).one())
+
+
+def load_snapshot(session, version):
+    groups = tuple(
+        GroupRec(*row) for row in session.execute(
+            select(Group.id, Group.name, Group.caption, Group.color, Group.webhook_footer,
+                   Group.webhook_footer_img, Group.webhook_url, Group.enabled, Group.updated_at)
+            .order_by(Group.name.asc())
+        )
+    )
+    services = tuple(sorted(
+        (ServiceRec(*row) for row in session.execute(select(Service.id, Service.name))),
+        key=lambda s: (s.name or "").lower(),
+    ))
+    links = tuple(
+        LinkRec(*row) for row in session.execute(
+            select(GroupService.id, GroupService.group_id, GroupService.service_id,
+                   GroupService.enabled, GroupService.webhook_url)
+        )
+    )
+
+    by_service, by_group = {}, {}
+    for link in links:
+        by_service.setdefault(link.service_id, []).append(link)
+        by_group.setdefault(link.group_id, []).append(link)
+
+    return ConfigSnapshot(
+        version=version,
+        groups=groups,
+        services=services,
+        links=links,
+        links_by_service={k: tuple(v) for k, v in by_service.items()},
+        links_by_group={k: tuple(v) for k, v in by_group.items()},
+    )
+
+
+class SnapshotStore:
+    """
+    Holds the current snapshot for the whole Streamlit process (wrap it in
+    st.cache_resource). A rerun costs nothing unless this process wrote to the
+    config, or the periodic fingerprint probe sees an outside change.
+    """
+
+    def __init__(self, probe_interval=PROBE_INTERVAL):
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._write_version = None
+        self._fingerprint = None
+        self._probed_at = 0.0
+
+    def get(self, session):
+        with self._lock:
+            local = write_version()
+            probe_due = time.monotonic() - self._probed_at >= self.probe_interval
+            if self._snapshot is not None and local == self._write_version and not probe_due:
+                return self._snapshot
+
+            fingerprint = config_fingerprint(session)
+            self._probed_at = time.monotonic()
+            if self._snapshot is not None and local == self._write_version and fingerprint == self._fingerprint:
+                return self._snapshot
+
+            self._snapshot = load_snapshot(session, (local, fingerprint))
+            self._write_version = local
+            self._fingerprint = fingerprint
+            return self._snapshot
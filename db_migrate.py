@@ -1,4 +1,4 @@
-from db import SessionLocal, init_db
+from db import init_db, session_scope
 from models import Group, Service, GroupService
 
 def seed_initial_data(session):
@@ -20,7 +20,6 @@ def seed_initial_data(session):
     }
 
     init_db()
-    session = SessionLocal()
 
     for name, data in groups.items():
         existing = session.query(Group).filter(Group.name == name).first()
@@ -58,7 +57,5 @@ def seed_initial_data(session):
     print("Seeded groups, services, and group-service links.")
 
 if __name__ == "__main__":
-    init_db()
-    sess = SessionLocal()
-    seed_initial_data(sess)
-    sess.close()
\ No newline at end of file
+    with session_scope() as sess:
+        seed_initial_data(sess)
\ No newline at end of file
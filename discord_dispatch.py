@@ -0,0 +1,281 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from http_pool import get_client, new_async_client
+
+TIMEOUT = 10
+MAX_RETRIES = 3        # retries for network errors / 5xx
+MAX_RATE_LIMITED = 5   # retries after a 429 before giving up
+BACKOFF = 0.5          # seconds, doubled per retry
+PROBE_WAIT = 0.05      # seconds between checks while a route's first request is in flight
+
+
+@dataclass
+class DeliveryResult:
+    url: str
+    ok: bool
+    status_code: Optional[int] = None
+    attempts: int = 0
+    rate_limited: int = 0      # how many 429s we hit on the way
+    error: Optional[str] = None
+
+
+def route_key(url):
+    # Discord rate-limits per webhook (id/token), never per query string
+    parts = urlsplit(url)
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+class RateLimiter:
+    """
+    Tracks Discord rate-limit state from X-RateLimit-* headers and 429 responses.
+
+    Discord reports the same bucket hash for every webhook, but the limit
+    applies per bucket and webhook, so state is kept per (bucket, route); a
+    bucket holds (remaining, reset_at, limit, window). Sends reserve a slot
+    from the bucket before going out, so concurrent senders stay under the
+    limit instead of racing into a 429. Within a window `remaining` only goes
+    down: a late response doesn't see the requests still in flight. When a
+    window runs out the bucket is refilled from its known limit, less the
+    requests still in flight. A route with no known limit yet gets one request
+    in flight until its response headers arrive. A global 429 pauses every
+    route until it resets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._route_bucket = {}    # route -> bucket hash
+        self._buckets = {}         # bucket key -> [remaining, reset_at (monotonic), limit, window]
+        self._probing = {}         # route -> deadline of the one request learning its limits
+        self._inflight = {}        # route -> requests sent and not yet answered
+        self._global_reset = 0.0
+
+    def _key(self, route):
+        bucket_id = self._route_bucket.get(route)
+        return f"{bucket_id}:{route}" if bucket_id else route
+
+    def _sent(self, route):
+        self._inflight[route] = self._inflight.get(route, 0) + 1
+        return 0.0
+
+    def _answered(self, route):
+        self._probing.pop(route, None)
+        count = self._inflight.get(route, 0) - 1
+        if count > 0:
+            self._inflight[route] = count
+        else:
+            self._inflight.pop(route, None)
+
+    def acquire(self, url):
+        """Reserve a send slot. Returns 0 if the caller may send now, else seconds to wait."""
+        route = route_key(url)
+        with self._lock:
+            now = time.monotonic()
+            if self._global_reset > now:
+                return self._global_reset - now
+
+            bucket = self._buckets.get(self._key(route))
+            if bucket is not None and now >= bucket[1]:
+                limit, window = bucket[2], bucket[3]
+                if limit:
+                    # New window: refill from the known limit
+                    bucket[0], bucket[1] = limit - self._inflight.get(route, 0), now + window
+                else:
+                    bucket = None      # only known from a 429; learn the limit again
+            if bucket is None:
+                # Unknown limits: one request at a time until headers come back
+                deadline = self._probing.get(route)
+                if deadline is not None and deadline > now:
+                    return PROBE_WAIT
+                self._probing[route] = now + TIMEOUT
+                return self._sent(route)
+            if bucket[0] <= 0:
+                return bucket[1] - now
+            bucket[0] -= 1
+            return self._sent(route)
+
+    def release(self, url):
+        """The request sent after acquire() got no response (network error)."""
+        with self._lock:
+            self._answered(route_key(url))
+
+    def update(self, url, status_code, headers, body=None):
+        """
+        Record the limits from a response. Returns the retry delay in seconds
+        for a 429, otherwise None.
+        """
+        route = route_key(url)
+        now = time.monotonic()
+        with self._lock:
+            self._answered(route)
+            bucket_id = headers.get("X-RateLimit-Bucket")
+            if bucket_id:
+                self._route_bucket[route] = bucket_id
+            key = self._key(route)
+            known = self._buckets.get(key)
+
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+            if remaining is not None and reset_after is not None:
+                try:
+                    remaining, reset_after = int(remaining), float(reset_after)
+                    limit = int(headers.get("X-RateLimit-Limit") or 0) or (known[2] if known else None)
+                    # Window length: the longest reset we've seen for this bucket
+                    window = max(reset_after, known[3] if known else 0.0)
+                    reset_at = now + reset_after
+                    if known is None or now >= known[1]:
+                        self._buckets[key] = [remaining - self._inflight.get(route, 0), reset_at, limit, window]
+                    elif reset_at >= known[1] - window / 2:
+                        # Same window: keep the lower count (it includes our reservations)
+                        # and the later reset (a refilled window starts before the server's)
+                        known[0], known[1] = min(known[0], remaining), max(known[1], reset_at)
+                        known[2], known[3] = limit, window
+                    # else: answer from an earlier window, arriving late; ignore it
+                except ValueError:
+                    pass
+
+            if status_code != 429:
+                return None
+
+            body = body if isinstance(body, dict) else {}
+            retry_after = body.get("retry_after") or headers.get("Retry-After") or 1
+            try:
+                retry_after = float(retry_after)
+            except ValueError:
+                retry_after = 1.0
+
+            if body.get("global") or headers.get("X-RateLimit-Global"):
+                self._global_reset = max(self._global_reset, now + retry_after)
+            else:
+                known = self._buckets.get(key)
+                self._buckets[key] = [0, now + retry_after, known[2] if known else None,
+                                      known[3] if known else retry_after]
+            return retry_after
+
+
+def _post_kwargs(payload):
+    # Pre-serialized payloads (embed_templates) go out as-is
+    if isinstance(payload, (bytes, bytearray)):
+        return {"content": payload, "headers": {"Content-Type": "application/json"}}
+    return {"json": payload}
+
+
+class DiscordDispatcher:
+    """
+    Central Discord webhook sender. All posts go through one RateLimiter so a
+    broadcast stays just under the per-webhook and global limits, 429s are
+    retried after Retry-After instead of being dropped, and every send reports
+    a DeliveryResult.
+    """
+
+    def __init__(self, limiter=None, timeout=TIMEOUT, max_retries=MAX_RETRIES):
+        self.limiter = limiter or RateLimiter()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stats = {"sent": 0, "failed": 0, "rate_limited": 0}
+
+    def _handle(self, result, url, resp):
+        """Update limits from a response. Returns seconds to wait before retrying, or None if done."""
+        body = None
+        if resp.status_code == 429:
+            try:
+                body = resp.json()
+            except ValueError:
+                body = None
+        retry_after = self.limiter.update(url, resp.status_code, resp.headers, body)
+        result.status_code = resp.status_code
+
+        if retry_after is not None:
+            result.rate_limited += 1
+            self.stats["rate_limited"] += 1
+            if result.rate_limited > MAX_RATE_LIMITED:
+                result.error = "rate limited"
+                return None
+            return retry_after
+        if 200 <= resp.status_code < 300:
+            result.ok = True
+            return None
+        if resp.status_code >= 500 and result.attempts <= self.max_retries:
+            return BACKOFF * (2 ** (result.attempts - 1))
+        result.error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+        return None
+
+    def _finish(self, result):
+        self.stats["sent" if result.ok else "failed"] += 1
+        if not result.ok:
+            print(f"Discord delivery failed ({result.url}): {result.error}")
+        return result
+
+    def send(self, url, payload):
+        """Blocking send (Streamlit / scripts). `payload` is a dict or JSON bytes."""
+        result = DeliveryResult(url=url, ok=False)
+        client = get_client()
+        while True:
+            wait = self.limiter.acquire(url)
+            if wait > 0:
+                time.sleep(wait)
+                continue
+
+            result.attempts += 1
+            try:
+                resp = client.post(url, timeout=self.timeout, **_post_kwargs(payload))
+            except Exception as e:
+                self.limiter.release(url)
+                if isinstance(e, httpx.TransportError) and result.attempts <= self.max_retries:
+                    time.sleep(BACKOFF * (2 ** (result.attempts - 1)))
+                    continue
+                result.error = str(e) or type(e).__name__
+                return self._finish(result)
+
+            retry_in = self._handle(result, url, resp)
+            if retry_in is None:
+                return self._finish(result)
+            time.sleep(retry_in)
+
+    async def asend(self, url, payload, client=None):
+        """Non-blocking send; pass a shared httpx.AsyncClient when sending many."""
+        if client is None:
+            async with new_async_client(timeout=self.timeout) as own_client:
+                return await self.asend(url, payload, own_client)
+
+        result = DeliveryResult(url=url, ok=False)
+        while True:
+            wait = self.limiter.acquire(url)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            result.attempts += 1
+            try:
+                resp = await client.post(url, **_post_kwargs(payload))
+            except Exception as e:
+                self.limiter.release(url)
+                if isinstance(e, httpx.TransportError) and result.attempts <= self.max_retries:
+                    await asyncio.sleep(BACKOFF * (2 ** (result.attempts - 1)))
+                    continue
+                result.error = str(e) or type(e).__name__
+                return self._finish(result)
+
+            retry_in = self._handle(result, url, resp)
+            if retry_in is None:
+                return self._finish(result)
+            await asyncio.sleep(retry_in)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Process-wide dispatcher so every caller shares the same rate-limit state."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = DiscordDispatcher()
+        return _dispatcher
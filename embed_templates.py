@@ -0,0 +1,119 @@
+import json
+import threading
+
+try:
+    import orjson   # optional: several times faster than json for these payloads
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Serialize a payload to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def parse_color(value):
+    """Group colors are stored as hex strings ('FF0000' / '#ff0000'); Discord wants an int."""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        return int(str(value).strip().lstrip("#"), 16)
+    except ValueError:
+        return None
+
+
+class EmbedTemplate:
+    """
+    A Discord message with everything that is fixed per sender (username,
+    content, color, footer) serialized once. Rendering only encodes the
+    per-event embed fields and splices them between the precompiled head and
+    tail bytes.
+    """
+
+    def __init__(self, username=None, content=None, color=None, footer_text=None, footer_icon=None):
+        base = {}
+        if username:
+            base["username"] = username
+        if content:
+            base["content"] = content
+
+        embed = {}
+        color = parse_color(color)
+        if color is not None:
+            embed["color"] = color
+        if footer_text or footer_icon:
+            embed["footer"] = {"text": footer_text or ""}
+            if footer_icon:
+                embed["footer"]["icon_url"] = footer_icon
+
+        self.base = base
+        self.embed = embed
+
+        # {...base, "embeds":[{...embed, <fields go here>}]}
+        skeleton = dumps({**base, "embeds": [embed]})
+        head = skeleton[:-3]                # drop the closing "}]}"
+        self._head = head + b"," if embed else head
+        self._tail = b"}]}"
+
+    def render(self, **fields):
+        """Payload as a dict (for callers that still want to inspect it)."""
+        return {**self.base, "embeds": [self.render_embed(**fields)]}
+
+    def render_embed(self, **fields):
+        """Just the embed object, for packing several into one message."""
+        return {**self.embed, **fields}
+
+    def pack(self, embeds):
+        """One message carrying several rendered embeds (max 10, see coalesce.py)."""
+        return dumps({**self.base, "embeds": list(embeds)})
+
+    def render_bytes(self, **fields):
+        """Payload as ready-to-send JSON bytes."""
+        if not fields:
+            return self._head.rstrip(b",") + self._tail
+        if self.embed.keys() & fields.keys():
+            # Caller overrides a fixed field (e.g. a custom color): slow path
+            return dumps(self.render(**fields))
+        return self._head + dumps(fields)[1:-1] + self._tail
+
+
+class TemplateCache:
+    """
+    Compiled templates keyed by e.g. (service, group_id). Each entry remembers
+    the stamp it was built from (Group.updated_at), and is rebuilt as soon as a
+    caller presents a different stamp.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key, stamp, factory):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+        template = factory()
+        with self._lock:
+            self._entries[key] = (stamp, template)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+group_templates = TemplateCache()
+
+
+def group_template(service_name, group_id, updated_at, group_name, color, footer, footer_img):
+    """Cached template for sends of `service_name` to one group."""
+    return group_templates.get(
+        (service_name, group_id),
+        updated_at,
+        lambda: EmbedTemplate(username=group_name, color=color, footer_text=footer, footer_icon=footer_img),
+    )
@@ -0,0 +1,52 @@
+import os
+import threading
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2 = os.getenv("HTTP2", "1") != "0"
+except ImportError:
+    HTTP2 = False
+
+TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))   # keep idle TLS connections to discord.com warm
+
+
+def limits(max_connections=MAX_CONNECTIONS, max_keepalive=MAX_KEEPALIVE):
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def new_async_client(timeout=TIMEOUT, max_connections=MAX_CONNECTIONS, max_keepalive=MAX_KEEPALIVE):
+    """
+    Pooled keep-alive AsyncClient with the shared settings. Async clients are
+    tied to one event loop, so long-lived loops (the Whop server) keep one for
+    their lifetime and one-shot runs (health scan, broadcast) open one per run.
+    """
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=limits(max_connections, max_keepalive),
+        http2=HTTP2,
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Process-wide blocking client (thread-safe). Streamlit reruns and scripts all
+    reuse its connection pool, so only the first call pays the TCP+TLS handshake.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(timeout=TIMEOUT, limits=limits(), http2=HTTP2)
+        return _client
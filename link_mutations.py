@@ -0,0 +1,167 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, or_, select, update
+
+from check_webhooks import probe_url
+from discord_dispatch import get_dispatcher
+from models import GroupService
+
+NOTICE_USERNAME = "Webhook Manager"
+PROBE_WORKERS = 8      # new webhook URLs checked in parallel on a grid save
+
+
+@dataclass(frozen=True)
+class ChangedLink:
+    id: int
+    group_id: int
+    service_id: int
+    enabled: bool
+    webhook_url: Optional[str]
+
+
+def set_links_enabled(session, enabled, service_id=None, group_id=None, link_ids=None, with_webhook=False):
+    """
+    Enable/disable every matching link in one UPDATE and commit. Only rows whose
+    state actually flips are touched; they come back from RETURNING as
+    ChangedLink records, so callers can report counts and send notices without
+    re-reading the table.
+    """
+    conditions = [or_(GroupService.enabled.is_(None), GroupService.enabled != enabled)]
+    if service_id is not None:
+        conditions.append(GroupService.service_id == service_id)
+    if group_id is not None:
+        conditions.append(GroupService.group_id == group_id)
+    if link_ids is not None:
+        conditions.append(GroupService.id.in_(list(link_ids)))
+    if with_webhook:
+        conditions.append(GroupService.webhook_url.isnot(None))
+        conditions.append(GroupService.webhook_url != "")
+
+    columns = (GroupService.id, GroupService.group_id, GroupService.service_id,
+               GroupService.enabled, GroupService.webhook_url)
+    stmt = (
+        update(GroupService)
+        .where(*conditions)
+        .values(enabled=enabled, status_changed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+    if session.get_bind().dialect.update_returning:
+        rows = session.execute(stmt.returning(*columns)).all()
+    else:
+        # Old SQLite (< 3.35) / MySQL: pick the rows first, then update them by id
+        rows = session.execute(select(*columns).where(*conditions)).all()
+        if rows:
+            session.execute(stmt.where(GroupService.id.in_([r[0] for r in rows])))
+    session.commit()
+    return [ChangedLink(*row) for row in rows]
+
+
+def delete_links(session, link_ids):
+    """Remove links by id in one DELETE and commit. Returns how many went."""
+    link_ids = list(link_ids)
+    if not link_ids:
+        return 0
+    removed = session.execute(
+        delete(GroupService).where(GroupService.id.in_(link_ids)).execution_options(synchronize_session=False)
+    ).rowcount
+    session.commit()
+    return removed
+
+
+def save_link_edits(session, edits):
+    """
+    Apply edits from the group detail grid: {link_id: {"enabled": bool,
+    "webhook_url": str}}, changed fields only. New webhook URLs are probed
+    together first and only saved if Discord answers 2xx; an empty URL removes
+    the webhook. Everything that passes is written as one batched UPDATE by
+    primary key. Returns (rows written, {link_id: reason} for rejected URLs).
+    """
+    now = datetime.utcnow()
+    new_urls = {
+        link_id: change["webhook_url"].strip()
+        for link_id, change in edits.items()
+        if change.get("webhook_url")
+    }
+    probes = {}
+    if new_urls:
+        # Shared keep-alive client: no new TLS handshake per save
+        with ThreadPoolExecutor(max_workers=min(len(new_urls), PROBE_WORKERS)) as pool:
+            probes = dict(zip(new_urls, pool.map(probe_url, new_urls.values())))
+
+    rows, rejected = [], {}
+    for link_id, change in edits.items():
+        row = {"id": link_id}
+        if "enabled" in change:
+            row.update(enabled=bool(change["enabled"]), status_changed_at=now)
+        if "webhook_url" in change:
+            url = new_urls.get(link_id)
+            if url is None:
+                row.update(webhook_url=None, webhook_updated_at=None, health_status="unconfigured", health_failures=0)
+            else:
+                status, code, checked_at = probes.get(link_id, ("error", None, now))
+                if status == "ok":
+                    row.update(webhook_url=url, webhook_updated_at=now, health_status="ok",
+                               health_code=code, health_checked_at=checked_at, health_failures=0)
+                elif code in (401, 404):
+                    rejected[link_id] = f"Discord returned {code}: webhook appears invalid or deleted"
+                elif code is not None:
+                    rejected[link_id] = f"Discord returned HTTP {code}"
+                else:
+                    rejected[link_id] = "Error reaching Discord"
+        if len(row) > 1:
+            rows.append(row)
+
+    if rows:
+        # ORM bulk UPDATE by primary key: one executemany per set of changed columns
+        session.execute(update(GroupService), rows)
+        session.commit()
+    return len(rows), rejected
+
+
+# --- Notifications ----------------------------------------------------------
+# Discord notices triggered by a mutation are sent by one background thread so
+# the request that made the change returns as soon as the UPDATE commits.
+
+_notices = queue.Queue()
+_notice_thread = None
+_notice_lock = threading.Lock()
+
+
+def _notice_worker():
+    dispatcher = get_dispatcher()
+    while True:
+        url, payload = _notices.get()
+        try:
+            dispatcher.send(url, payload)   # waits out rate limits, logs failures
+        except Exception as e:
+            print(f"[notice] send to {url} failed: {e}")
+        finally:
+            _notices.task_done()
+
+
+def queue_notice(webhook_url, content, username=NOTICE_USERNAME):
+    """Send a plain-text Discord message in the background."""
+    global _notice_thread
+    if not webhook_url or not content:
+        return
+    payload = {"content": content}
+    if username:
+        payload["username"] = username
+    with _notice_lock:
+        if _notice_thread is None:
+            _notice_thread = threading.Thread(target=_notice_worker, name="link-notices", daemon=True)
+            _notice_thread.start()
+    _notices.put((webhook_url, payload))
+
+
+def disabled_notice(group_name, service_name):
+    return (
+        f"Service Announcement\n\n🔕 Webhook disabled for **{group_name} / {service_name}**."
+        f"\n\nPlease contact your provider (bennybags#0344) to re-enable services."
+    )
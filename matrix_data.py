@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Integer, cast, func, or_, select
+
+from config_snapshot import config_fingerprint
+from models import Group, GroupService, Service
+
+MISSING, DISABLED, ENABLED = -1, 0, 1
+
+LIST_COLUMNS = ["Group", "Service", "Enabled", "Health", "Code", "Last checked", "Webhook URL"]
+
+
+@dataclass(frozen=True)
+class MatrixData:
+    matrix: pd.DataFrame     # Group x Service, int8 MISSING / DISABLED / ENABLED
+
+    def emoji_grid(self):
+        values = self.matrix.to_numpy()
+        grid = np.select([values == ENABLED, values == DISABLED], ["✅", "❌"], default="—")
+        return pd.DataFrame(grid, index=self.matrix.index, columns=self.matrix.columns)
+
+
+def matrix_version(session):
+    """Cache key for load_matrix: changes with the config and after every health write."""
+    return config_fingerprint(session) + (session.execute(select(func.max(GroupService.health_checked_at))).scalar(),)
+
+
+def _dimensions(conn):
+    """Group display names and service names by id (the two small tables)."""
+    groups = conn.execute(select(Group.id, Group.name, Group.caption)).all()
+    services = conn.execute(select(Service.id, Service.name)).all()
+    group_names = [f"{name} | {caption.strip()}" if caption else (name or "") for _, name, caption in groups]
+    return ([g[0] for g in groups], group_names or [""]), ([s[0] for s in services], [s[1] for s in services] or [""])
+
+
+# --- Raw List: filtered, keyset-paginated ------------------------------------
+
+PAGE_SIZE = 100
+HEALTH_STATES = ["ok", "missing", "error", "unknown", "unconfigured"]
+
+
+@dataclass(frozen=True)
+class LinkFilter:
+    group_ids: tuple = ()
+    service_ids: tuple = ()
+    health: tuple = ()       # HEALTH_STATES; "unknown" also matches never-checked (NULL)
+
+    def conditions(self):
+        conds = []
+        if self.group_ids:
+            conds.append(GroupService.group_id.in_(self.group_ids))
+        if self.service_ids:
+            conds.append(GroupService.service_id.in_(self.service_ids))
+        if self.health:
+            health = GroupService.health_status.in_(self.health)
+            if "unknown" in self.health:
+                health = or_(health, GroupService.health_status.is_(None))
+            conds.append(health)
+        return conds
+
+
+def filter_options(session):
+    """(group id -> display name, service id -> name), sorted by name, for the filter widgets."""
+    groups, services = _dimensions(session.connection())
+    return (
+        dict(sorted(zip(*groups), key=lambda kv: kv[1].lower())),
+        dict(sorted(zip(*services), key=lambda kv: (kv[1] or "").lower())),
+    )
+
+
+def _listed_links(stmt):
+    """The joins both Raw List queries share, so the count matches the rows shown (orphaned links drop out of both)."""
+    return (
+        stmt.join(Group, GroupService.group_id == Group.id)
+        .join(Service, GroupService.service_id == Service.id)
+    )
+
+
+def count_links(session, filters):
+    """Total rows for the current filters."""
+    return session.execute(_listed_links(select(func.count(GroupService.id))).where(*filters.conditions())).scalar()
+
+
+def fetch_links_page(session, filters, after_id=None, page_size=PAGE_SIZE):
+    """
+    One page of the Raw List, ordered by link id. Keyset pagination: the page
+    starts after `after_id` (the last id of the previous page), so the cost is
+    the same on page 1 and page 1000. Returns (frame, last id, has more).
+    """
+    stmt = (
+        _listed_links(select(
+            GroupService.id,
+            Group.name,
+            Group.caption,
+            Service.name,
+            GroupService.enabled,
+            GroupService.health_status,
+            GroupService.health_code,
+            GroupService.health_checked_at,
+            GroupService.webhook_url,
+        ))
+        .where(*filters.conditions())
+        .order_by(GroupService.id)
+        .limit(page_size + 1)
+    )
+    if after_id is not None:
+        stmt = stmt.where(GroupService.id > after_id)
+    rows = session.execute(stmt).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    frame = pd.DataFrame(
+        [
+            (
+                f"{group} | {caption.strip()}" if caption else group,
+                service,
+                bool(enabled),
+                status or "unknown",
+                code,
+                checked_at,
+                url or "",
+            )
+            for _, group, caption, service, enabled, status, code, checked_at, url in rows
+        ],
+        columns=LIST_COLUMNS,
+    )
+    return frame, (rows[-1][0] if rows else after_id), has_more
+
+
+def _labels(ids, dim_ids, dim_names):
+    """Position of each id in the dimension table (-1 = unknown) and its display name."""
+    positions = pd.Index(dim_ids).get_indexer(ids)
+    return positions, np.asarray(dim_names, dtype=object)
+
+
+def build_matrix(links, groups, services):
+    """
+    Group x Service status codes from an int array of (group_id, service_id,
+    enabled) rows. Same shape/order as pivot_table(aggfunc="first") over the
+    display names, without materializing a string per link.
+    """
+    group_pos, group_names = _labels(links[:, 0], *groups)
+    service_pos, service_names = _labels(links[:, 1], *services)
+    keep = (group_pos >= 0) & (service_pos >= 0)
+    group_pos, service_pos, enabled = group_pos[keep], service_pos[keep], links[keep, 2]
+
+    # Sorted display names that actually have links; groups can share a name
+    group_index = pd.Index(group_names[np.unique(group_pos)]).unique().sort_values()
+    service_index = pd.Index(service_names[np.unique(service_pos)]).unique().sort_values()
+    group_codes = group_index.get_indexer(group_names)[group_pos]
+    service_codes = service_index.get_indexer(service_names)[service_pos]
+
+    n_services = len(service_index)
+    matrix = np.full((len(group_index), n_services), MISSING, dtype=np.int8)
+    # Keep the first link per cell, like aggfunc="first"
+    cells, first = np.unique(group_codes.astype(np.int64) * n_services + service_codes, return_index=True)
+    matrix.flat[cells] = enabled[first]
+    return pd.DataFrame(
+        matrix,
+        index=pd.Index(group_index, name="Group"),
+        columns=pd.Index(service_index, name="Service"),
+    )
+
+
+def load_matrix(session):
+    """Only the three integer columns the grid needs, read straight off the DBAPI cursor."""
+    conn = session.connection()
+    groups, services = _dimensions(conn)
+    result = conn.execute(
+        select(
+            GroupService.group_id,
+            GroupService.service_id,
+            func.coalesce(cast(GroupService.enabled, Integer), 0),
+        ).where(GroupService.group_id.isnot(None), GroupService.service_id.isnot(None))
+    )
+    try:
+        # Plain int tuples -> one C-level conversion; no Row objects per link
+        links = np.array(result.cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+    finally:
+        result.close()
+    return MatrixData(matrix=build_matrix(links, groups, services))
@@ -0,0 +1,245 @@
+"""
+Versioned schema migrations.
+
+The applied revision is stored in the one-row `schema_version` table. When it
+already equals HEAD, migrate() is a single SELECT; nothing is reflected or
+created. Otherwise each pending revision runs in its own transaction together
+with the version bump.
+
+Adding a change: append a function to MIGRATIONS (never edit or reorder
+applied ones). DDL steps should be idempotent (checkfirst / has_index) because
+databases created before this runner existed start at revision 0 with some of
+the objects already in place. Large data fixes go through backfill(), which
+commits in batches so the app keeps working while it runs.
+
+    python migrations.py            # upgrade to HEAD
+    python migrations.py --status
+"""
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, and_, delete, func, inspect, select, text, update
+from sqlalchemy.exc import DBAPIError
+
+from models import Base, GroupService, WhopEvent
+
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+BACKFILL_BATCH = 5000
+BACKFILL_PAUSE = 0.05   # seconds between batches, lets app writes through
+LOG_SAMPLE = 10         # row ids printed when a migration deletes rows
+
+
+def _create_index(conn, table, name):
+    index = next(i for i in table.indexes if i.name == name)
+    if not conn.dialect.has_index(conn, table.name, name):
+        index.create(bind=conn)
+
+
+def _add_column(conn, table, name):
+    if name in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+        return
+    column = table.c[name]
+    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(conn.dialect)}"))
+
+
+# --- Revisions --------------------------------------------------------------
+
+def m001_create_tables(conn):
+    """Base tables (no-op on databases created by the old create_all)."""
+    Base.metadata.create_all(bind=conn)
+
+
+def m002_unique_links(conn):
+    """One link per (group, service)."""
+    if conn.dialect.has_index(conn, "group_services", "uq_group_services_group_service"):
+        return
+    # Older databases can hold duplicate pairs, which would block the unique
+    # index: keep one per pair (the oldest one with a webhook, else the oldest)
+    # and fold the others into it before deleting them.
+    links = GroupService.__table__
+    dup_pairs = (
+        select(links.c.group_id, links.c.service_id)
+        .group_by(links.c.group_id, links.c.service_id)
+        .having(func.count(links.c.id) > 1)
+        .subquery()
+    )
+    rows = conn.execute(
+        select(links.c.id, links.c.group_id, links.c.service_id, links.c.enabled,
+               links.c.webhook_url, links.c.caption)
+        .join(dup_pairs, and_(links.c.group_id == dup_pairs.c.group_id,
+                              links.c.service_id == dup_pairs.c.service_id))
+        .order_by(links.c.id)
+    ).all()
+
+    pairs = {}
+    for row in rows:
+        pairs.setdefault((row.group_id, row.service_id), []).append(row)
+    removed = []
+    for dups in pairs.values():
+        keep = next((r for r in dups if r.webhook_url), dups[0])
+        values = {}
+        # Enabled if any copy was (that copy was the one delivering)
+        if not keep.enabled and any(r.enabled for r in dups):
+            values["enabled"] = True
+        if not keep.caption:
+            caption = next((r.caption for r in dups if r.caption), None)
+            if caption:
+                values["caption"] = caption
+        if values:
+            conn.execute(update(links).where(links.c.id == keep.id).values(**values))
+        removed.extend(r.id for r in dups if r.id != keep.id)
+
+    if removed:
+        for start in range(0, len(removed), BACKFILL_BATCH):
+            conn.execute(delete(links).where(links.c.id.in_(removed[start:start + BACKFILL_BATCH])))
+        sample = ", ".join(map(str, removed[:LOG_SAMPLE])) + (", ..." if len(removed) > LOG_SAMPLE else "")
+        print(f"[migrate] removed {len(removed)} duplicate group_services rows "
+              f"({len(pairs)} pairs), ids: {sample}")
+    _create_index(conn, GroupService.__table__, "uq_group_services_group_service")
+
+
+def m003_link_query_indexes(conn):
+    """FK index on service_id."""
+    _create_index(conn, GroupService.__table__, "ix_group_services_service_id")
+
+
+def m004_whop_event_ids(conn):
+    """Unique event_id on the Whop outbox (dedupe)."""
+    _create_index(conn, WhopEvent.__table__, "ix_whop_events_event_id")
+
+
+def m005_outbox_dead_letters(conn):
+    """Dead letters, per-target delivery and pending/dead indexes on the Whop outbox."""
+    _add_column(conn, WhopEvent.__table__, "dead_at")
+    _add_column(conn, WhopEvent.__table__, "delivered_urls")
+    _create_index(conn, WhopEvent.__table__, "ix_whop_events_pending")
+    _create_index(conn, WhopEvent.__table__, "ix_whop_events_dead")
+
+
+def m006_health_failures(conn):
+    """Persisted error streak per link, for health check backoff."""
+    _add_column(conn, GroupService.__table__, "health_failures")
+
+MIGRATIONS = [
+    m001_create_tables,
+    m002_unique_links,
+    m003_link_query_indexes,
+    m004_whop_event_ids,
+    m005_outbox_dead_letters,
+    m006_health_failures,
+]
+HEAD = len(MIGRATIONS)
+
+
+# --- Backfills --------------------------------------------------------------
+
+def backfill(engine, table, where, values, batch_size=BACKFILL_BATCH, pause=BACKFILL_PAUSE):
+    """
+    UPDATE `table` SET `values` WHERE `where`, one batch of primary keys per
+    transaction, so no lock is held for longer than one batch. `where` must stop
+    matching a row once it is updated; a crash midway then simply resumes.
+    """
+    pk = table.c.id
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            _no_timeout(conn)
+            ids = conn.execute(select(pk).where(where).order_by(pk).limit(batch_size)).scalars().all()
+            if not ids:
+                break
+            conn.execute(update(table).where(pk.in_(ids)).values(**values))
+        total += len(ids)
+        print(f"[migrate] backfill {table.name}: {total} rows")
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+# --- Runner -----------------------------------------------------------------
+
+def current_version(conn):
+    try:
+        return conn.execute(select(schema_version.c.version).where(schema_version.c.id == 1)).scalar() or 0
+    except DBAPIError:
+        conn.rollback()
+        return 0     # table not there yet
+
+
+def _no_timeout(conn):
+    # The app engines cap statements (5s for the Whop server, which migrates on
+    # startup); an index build or dedupe on a big table must not hit that cap
+    # halfway. SET LOCAL only lasts until this transaction ends.
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+def _lock(conn):
+    # Streamlit and the Whop server may start at the same time; waiting for the
+    # other process to finish its migrations is not subject to the timeout either
+    _no_timeout(conn)
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(727001)"))
+
+
+def _record(conn, version, description):
+    values = {"version": version, "description": description, "applied_at": datetime.utcnow()}
+    if conn.execute(update(schema_version).where(schema_version.c.id == 1).values(**values)).rowcount == 0:
+        conn.execute(schema_version.insert().values(id=1, **values))
+
+
+def migrate(engine, target=HEAD):
+    """Bring the database up to `target`. Returns the revision numbers applied (usually [])."""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version >= target:
+        return []
+    applied = []
+
+    with engine.begin() as conn:
+        version_metadata.create_all(bind=conn)
+
+    for number in range(version + 1, target + 1):
+        step = MIGRATIONS[number - 1]
+        description = (step.__doc__ or step.__name__).strip()
+
+        if getattr(step, "online", False):
+            # Batched data migration: commits as it goes, version recorded at the end
+            with engine.connect() as conn:
+                if current_version(conn) >= number:
+                    continue
+            step(engine)
+            with engine.begin() as conn:
+                _lock(conn)
+                if current_version(conn) < number:
+                    _record(conn, number, description)
+        else:
+            with engine.begin() as conn:
+                _lock(conn)
+                if current_version(conn) >= number:
+                    continue    # another process got here first
+                step(conn)
+                _record(conn, number, description)
+        applied.append(number)
+        print(f"[migrate] {number:03d} {description}")
+    return applied
+
+
+if __name__ == "__main__":
+    from db import engine
+
+    if "--status" in sys.argv:
+        with engine.connect() as conn:
+            print(f"revision {current_version(conn)} of {HEAD}")
+    else:
+        applied = migrate(engine)
+        print(f"applied {applied}" if applied else "already at HEAD", f"(revision {HEAD})")
@@ -1,11 +1,18 @@
 from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, Index, func, text
 from datetime import datetime
 
 Base = declarative_base()
 
 class GroupService(Base):
     __tablename__ = "group_services"
+    __table_args__ = (
+        # One link per (group, service); onboarding relies on it for ON CONFLICT DO NOTHING.
+        # Its leading column also serves the group_id FK join.
+        Index("uq_group_services_group_service", "group_id", "service_id", unique=True),
+        # service_id FK join, per-service toggles and counts
+        Index("ix_group_services_service_id", "service_id"),
+    )
     id = Column(Integer, primary_key=True)
     group_id = Column(Integer, ForeignKey('groups.id'))
     service_id = Column(Integer, ForeignKey('services.id'))
@@ -16,6 +23,7 @@ class GroupService(Base):
     health_status = Column(String, default="unknown")   # ok, missing, error
     health_code = Column(Integer, nullable=True)        # HTTP status
     health_checked_at = Column(DateTime, nullable=True)
+    health_failures = Column(Integer, default=0)        # consecutive "error" checks, drives retry backoff
     caption = Column(Text)
     group = relationship("Group", back_populates="group_services")
     service = relationship("Service", back_populates="group_services")
@@ -38,3 +46,34 @@ class Service(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     group_services = relationship("GroupService", back_populates="service")
+
+class WhopEvent(Base):
+    # Outbox for Whop deliveries. Rows are marked delivered (pruned after
+    # OUTBOX_RETENTION) or dead-lettered after too many failed attempts.
+    __tablename__ = "whop_events"
+    __table_args__ = (
+        # Delivery poll and /metrics: only rows still waiting, so it stays as small as the backlog
+        Index(
+            "ix_whop_events_pending",
+            "next_attempt_at", "id",
+            sqlite_where=text("delivered_at IS NULL AND dead_at IS NULL"),
+            postgresql_where=text("delivered_at IS NULL AND dead_at IS NULL"),
+        ),
+        Index(
+            "ix_whop_events_dead",
+            "dead_at",
+            sqlite_where=text("dead_at IS NOT NULL"),
+            postgresql_where=text("dead_at IS NOT NULL"),
+        ),
+    )
+    id = Column(Integer, primary_key=True)
+    event_id = Column(String, unique=True, index=True)     # Whop message id; null if missing
+    event_type = Column(String)
+    payload = Column(Text)                                # raw JSON as received
+    received_at = Column(DateTime, default=datetime.utcnow)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)     # null = deliver now
+    delivered_at = Column(DateTime, nullable=True)
+    dead_at = Column(DateTime, nullable=True)             # gave up: permanent error or too many attempts
+    delivered_urls = Column(Text)                         # JSON list of targets already sent to; skipped on retry
+    last_error = Column(Text)
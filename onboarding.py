@@ -0,0 +1,55 @@
+from sqlalchemy import and_, exists, insert, join, literal, select, true
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Group, GroupService, Service
+
+LINK_COLUMNS = ["group_id", "service_id", "enabled"]
+
+
+def _insert_links(dialect_name):
+    if dialect_name == "postgresql":
+        return postgresql.insert(GroupService)
+    if dialect_name == "sqlite":
+        return sqlite.insert(GroupService)
+    return insert(GroupService)
+
+
+def link_pairs(session, group_ids=None, service_ids=None, enabled=False):
+    """
+    Create the missing links between `group_ids` x `service_ids` (None = all)
+    as one INSERT ... SELECT ... ON CONFLICT DO NOTHING and commit. Existing
+    links are left alone. Returns how many links were created.
+    """
+    pairs = (
+        select(Group.id, Service.id, literal(enabled))
+        .select_from(join(Group, Service, true()))     # every group x every service
+        .where(
+            # Also keeps the SELECT unambiguous for SQLite's upsert parser
+            true(),
+            ~exists().where(and_(GroupService.group_id == Group.id, GroupService.service_id == Service.id)),
+        )
+    )
+    if group_ids is not None:
+        pairs = pairs.where(Group.id.in_(list(group_ids)))
+    if service_ids is not None:
+        pairs = pairs.where(Service.id.in_(list(service_ids)))
+
+    dialect_name = session.get_bind().dialect.name
+    stmt = _insert_links(dialect_name).from_select(LINK_COLUMNS, pairs)
+    if dialect_name in ("postgresql", "sqlite"):
+        # A concurrent onboarding of the same pair loses the race quietly
+        stmt = stmt.on_conflict_do_nothing(index_elements=["group_id", "service_id"])
+
+    created = session.execute(stmt).rowcount
+    session.commit()
+    return created
+
+
+def link_services(session, group_id, service_ids=None, enabled=False):
+    """Onboard one group to the given services (all services if None)."""
+    return link_pairs(session, [group_id], service_ids, enabled)
+
+
+def link_service_to_all_groups(session, service_id, enabled=False):
+    """Onboard one service to every group."""
+    return link_pairs(session, None, [service_id], enabled)
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+
+from check_webhooks import load_url_index, probe_urls, write_health_results
+from db import read_session, session_scope
+from models import Group, GroupService, Service
+
+BROKEN = ("missing", "error")
+
+
+@dataclass
+class ScanJob:
+    """One health scan running in a background thread. Fields are read by the UI while it runs."""
+    id: str
+    state: str = "queued"        # queued, running, done, cancelled, failed
+    total: int = 0               # URLs to probe
+    checked: int = 0
+    failures: int = 0            # probes that came back missing/error
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    results: list = field(default_factory=list)   # broken links when the job ended
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class ScanJobs:
+    """
+    Runs at most one scan at a time for the whole process (wrap it in
+    st.cache_resource). Submitting while a scan is active returns that scan.
+    """
+
+    def __init__(self, keep=20):
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+
+    def submit(self):
+        with self._lock:
+            current = self._latest()
+            if current is not None and current.active:
+                return current
+            job = ScanJob(id=uuid.uuid4().hex[:8])
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+        threading.Thread(target=run_scan, args=(job,), name=f"health-scan-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _latest(self):
+        return next(reversed(self._jobs.values()), None)
+
+
+def load_link_labels(session):
+    """Group/service names and last stored health of every enabled link."""
+    return session.execute(
+        select(
+            GroupService.id,
+            Group.name,
+            Service.name,
+            GroupService.health_status,
+            GroupService.health_code,
+            GroupService.health_checked_at,
+        )
+        .join(Group, GroupService.group_id == Group.id)
+        .join(Service, GroupService.service_id == Service.id)
+        .where(GroupService.enabled == True)
+    ).all()
+
+
+def broken_links(labels, url_index, results):
+    """Links that are broken after the scan: fresh probe result if we have one, else the stored health."""
+    url_of = {link_id: url for url, ids in url_index.items() for link_id in ids}
+    broken = []
+    for link_id, group_name, service_name, status, code, checked_at in labels:
+        probed = results.get(url_of.get(link_id))
+        if probed is not None:
+            status, code, checked_at = probed
+        if status in BROKEN:
+            broken.append({
+                "group_name": group_name,
+                "service_name": service_name,
+                "status": status,
+                "code": code,
+                "checked_at": checked_at,
+            })
+    return broken
+
+
+def run_scan(job):
+    """
+    Full scan: probe every enabled link's URL now, whatever its last check, so
+    a webhook deleted minutes ago shows up. (The worker only re-probes stale
+    links.) Whatever finished is saved even if the job is cancelled.
+    """
+    try:
+        with read_session() as session:
+            url_index = load_url_index(session)
+            labels = load_link_labels(session)
+        job.total = len(url_index)
+        job.state = "running"
+
+        def on_result(url, result):
+            job.checked += 1
+            if result[0] in BROKEN:
+                job.failures += 1
+
+        results = asyncio.run(probe_urls({url: url for url in url_index}, on_result=on_result, cancel=job.cancel_event))
+        with session_scope() as session:
+            write_health_results(session, url_index, results)
+
+        job.results = broken_links(labels, url_index, results)
+        job.state = "cancelled" if job.cancel_event.is_set() else "done"
+    except Exception as e:
+        print(f"Health scan {job.id} failed: {e}")
+        job.error = str(e)
+        job.state = "failed"
+    finally:
+        job.finished_at = datetime.utcnow()
@@ -2,7 +2,6 @@ import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 from datetime import date, timedelta, datetime, timezone
-from discord_webhook import DiscordWebhook, DiscordEmbed
 # import random
 import time
 # import timeit
@@ -18,34 +17,22 @@ from email.mime.multipart import MIMEMultipart
 from requests_html2 import HTMLSession
 from curl_cffi import requests
 
-from db import SessionLocal
-from models import Group, Service, GroupService
+from discord_dispatch import get_dispatcher
+from broadcast import broadcast
+from embed_templates import EmbedTemplate, group_templates
+from coalesce import pack_embeds
 
 def send_message_db():
-    session = SessionLocal()
     message_test = "test message"
 
-    enabled_links = session.query(GroupService).filter_by(enabled=True).all()
-    for link in enabled_links:
-        group = link.group
-        service = link.service
-
-        # Prefer per-service webhook; fall back to group webhook if None
-        webhook_url = link.webhook_url or group.webhook_url
-        if not webhook_url:
-            continue  # nothing to send to
-
-        webhook = DiscordWebhook(url=webhook_url, username=group.name)
-        embed = DiscordEmbed(
-            title=f"Test for {service.name} and {group.name}",
-            description=message_test,
-            color=group.color,
-        )
-        embed.set_footer(text=group.webhook_footer, icon_url=group.webhook_footer_img)
-        webhook.add_embed(embed)
-        response = webhook.execute(remove_embeds=True)
-
-    session.close()
+    # One joined query for every enabled link, sent concurrently; per-group
+    # color/footer/username are filled in by the broadcast layer.
+    results = broadcast(
+        None,
+        lambda t: {"title": f"Test for {t.service_name} and {t.group_name}", "description": message_test},
+    )
+    failed = [r for r in results if not r.delivery.ok]
+    print(f"Sent {len(results) - len(failed)}/{len(results)} test messages")
 
 send_message_db()
 
@@ -127,41 +114,40 @@ def dsm(url, retailer):
         # pass
         return 0
     else:
-        for i in range(0, len(food_df)):
-            for z in c.groups.values():
-                name = z['name']
-                webhook_footer = z['webhook_footer']
-                color = z['color']
-                whop_url = z['whop_url']
-                webhook_footer_img = z['webhook_footer_img']
-                webhook = z['webhook']
-
-                webhook_name = DiscordWebhook(url=webhook, username=name)
-                embed = DiscordEmbed(title="{}{}".format(retailer, ' New Raffle'),description='{}'.format(food_df['desc'][i]), color=color)
-                embed.add_embed_field(name="Retailer", value=food_df['retailer'][i], inline=True)
-                embed.add_embed_field(name="Link", value="[{}]({})".format("Click here for raffle link",food_df['url_link'][i]), inline=True)
-
-                embed.set_footer(text=webhook_footer, icon_url=webhook_footer_img)
-                embed.set_image(url=food_df['img_link'][i])
-
-                webhook_name.add_embed(embed)
-                response = webhook_name.execute(remove_embeds=True)
+        for z in c.groups.values():
+            # Username/color/footer are compiled once per group; only the raffle fields change
+            template = group_templates.get(
+                ("dsm", z['name']),
+                None,
+                lambda: EmbedTemplate(username=z['name'], color=z['color'],
+                                      footer_text=z['webhook_footer'], footer_icon=z['webhook_footer_img']),
+            )
+            embeds = [
+                template.render_embed(
+                    title="{}{}".format(retailer, ' New Raffle'),
+                    description='{}'.format(food_df['desc'][i]),
+                    fields=[
+                        {"name": "Retailer", "value": str(food_df['retailer'][i]), "inline": True},
+                        {"name": "Link", "value": "[{}]({})".format("Click here for raffle link", food_df['url_link'][i]), "inline": True},
+                    ],
+                    image={"url": food_df['img_link'][i]},
+                )
+                for i in range(0, len(food_df))
+            ]
+            # Up to 10 raffles per Discord message instead of one request each
+            for chunk in pack_embeds(embeds):
+                get_dispatcher().send(z['webhook'], template.pack(chunk))   # logs its own failures
 
 def triage_webhook(response_code, service):
     if response_code == 200:
         for z in c.groups_triage.values():
-            name = z['name']
-            webhook_footer = z['webhook_footer']
-            color = z['color']
-            whop_url = z['whop_url']
-            webhook_footer_img = z['webhook_footer_img']
-            webhook = z['webhook']
-
-            webhook_name = DiscordWebhook(url=webhook, username=name)
-
-            embed = DiscordEmbed(title="Triage - Check Webhook", description='{}'.format(service), color=color)
-            webhook_name.add_embed(embed)
-            response = webhook_name.execute(remove_embeds=True)
+            template = group_templates.get(
+                ("triage", z['name']),
+                None,
+                lambda: EmbedTemplate(username=z['name'], color=z['color']),
+            )
+            payload = template.render_bytes(title="Triage - Check Webhook", description='{}'.format(service))
+            get_dispatcher().send(z['webhook'], payload)
 
 def convert_to_unix_timestamp(date_str):
     if date_str.lower() == "varies":
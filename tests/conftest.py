@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app modules from the repo root, and never touch the app database
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
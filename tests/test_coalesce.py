@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import broadcast
+from broadcast import BroadcastTarget, abroadcast, abroadcast_many
+from coalesce import Coalescer
+from discord_dispatch import DeliveryResult
+from embed_templates import EmbedTemplate
+
+URL = "https://discord.com/api/webhooks/1/token"
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.messages = []     # (url, embeds)
+        self.sent_at = []      # loop time of each message
+
+    async def asend(self, url, payload, client=None):
+        self.messages.append((url, json.loads(payload)["embeds"]))
+        self.sent_at.append(asyncio.get_running_loop().time())
+        return DeliveryResult(url=url, ok=True, status_code=204, attempts=1)
+
+
+def embed(n):
+    return {"title": f"item {n}"}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_burst_goes_out_in_messages_of_ten():
+    dispatcher = FakeDispatcher()
+    template = EmbedTemplate(username="bot")
+
+    async def main():
+        async with Coalescer(window=0.05, max_latency=1, dispatcher=dispatcher) as co:
+            return await asyncio.gather(*(co.submit(URL, template, embed(n)) for n in range(25)))
+
+    results = run(main())
+    assert [len(embeds) for _, embeds in dispatcher.messages] == [10, 10, 5]
+    assert [e["title"] for _, embeds in dispatcher.messages for e in embeds] == [f"item {n}" for n in range(25)]
+    assert all(r.ok for r in results)
+
+
+def test_quiet_window_flushes_and_webhooks_stay_apart():
+    dispatcher = FakeDispatcher()
+    template = EmbedTemplate()
+    other = "https://discord.com/api/webhooks/2/token"
+
+    async def main():
+        async with Coalescer(window=0.05, max_latency=1, dispatcher=dispatcher) as co:
+            first = asyncio.gather(co.submit(URL, template, embed(0)), co.submit(other, template, embed(1)))
+            await asyncio.sleep(0.15)           # longer than the window: those two went out alone
+            assert len(dispatcher.messages) == 2
+            await asyncio.gather(first, co.submit(URL, template, embed(2)))
+
+    run(main())
+    assert sorted((url, len(embeds)) for url, embeds in dispatcher.messages) == [(URL, 1), (URL, 1), (other, 1)]
+
+
+def test_max_latency_bounds_a_steady_trickle():
+    dispatcher = FakeDispatcher()
+    template = EmbedTemplate()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        async with Coalescer(window=0.1, max_latency=0.2, dispatcher=dispatcher) as co:
+            started = loop.time()
+            sent = []
+            for n in range(8):     # one every 0.05s: never quiet for a whole window
+                sent.append(asyncio.ensure_future(co.submit(URL, template, embed(n))))
+                await asyncio.sleep(0.05)
+            await asyncio.gather(*sent)
+            return started
+
+    started = run(main())
+    # The first embed waited max_latency, not until the trickle stopped (0.4s)
+    assert dispatcher.sent_at[0] - started < 0.3
+    assert len(dispatcher.messages) >= 2
+    assert sum(len(embeds) for _, embeds in dispatcher.messages) == 8
+
+
+def test_broadcasts_sharing_a_coalescer_merge_per_webhook(monkeypatch):
+    dispatcher = FakeDispatcher()
+    targets = [
+        BroadcastTarget(n, f"https://discord.com/api/webhooks/{n}/token", "svc", n, f"group{n}", None, None, None, None)
+        for n in range(3)
+    ]
+    monkeypatch.setattr(broadcast, "load_targets", lambda session, service_name=None: targets)
+
+    async def main():
+        async with Coalescer(window=0.05, dispatcher=dispatcher) as co:
+            return await asyncio.gather(*(
+                abroadcast("svc", lambda t, n=n: embed(n), coalescer=co) for n in range(4)
+            ))
+
+    results = run(main())
+    # 4 items x 3 webhooks: one message per webhook instead of 12
+    assert len(dispatcher.messages) == 3
+    assert all(len(embeds) == 4 for _, embeds in dispatcher.messages)
+    assert all(r.delivery.ok for per_item in results for r in per_item)
+
+
+def test_broadcast_many_reports_per_target_and_item(monkeypatch):
+    dispatcher = FakeDispatcher()
+    targets = [BroadcastTarget(1, URL, "svc", 1, "group1", None, None, None, None)]
+    monkeypatch.setattr(broadcast, "load_targets", lambda session, service_name=None: targets)
+    monkeypatch.setattr("coalesce.get_dispatcher", lambda: dispatcher)
+
+    results = run(abroadcast_many("svc", ["a", "b", "bad"], lambda t, item: {"title": item} if item != "bad" else None))
+    assert len(dispatcher.messages) == 1
+    assert [r.delivery.ok for r in results] == [True, True, False]
+    assert results[2].delivery.error.startswith("embed:")
@@ -0,0 +1,114 @@
+import asyncio
+import random
+import time
+
+import httpx
+
+from discord_dispatch import DiscordDispatcher, RateLimiter
+
+HOOK = "https://discord.com/api/webhooks/{}/token"
+
+
+def headers(remaining, reset_after, limit=5, bucket="shared"):
+    return {
+        "X-RateLimit-Bucket": bucket,
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset-After": str(reset_after),
+    }
+
+
+def test_webhooks_sharing_a_bucket_hash_have_separate_budgets():
+    limiter = RateLimiter()
+    first, second = HOOK.format(0), HOOK.format(1)
+
+    assert limiter.acquire(first) == 0
+    limiter.update(first, 200, headers(4, 2))
+    for _ in range(4):
+        assert limiter.acquire(first) == 0
+    assert limiter.acquire(first) > 0
+
+    # Same bucket hash, different webhook: its own budget, not webhook 0's
+    assert limiter.acquire(second) == 0
+    limiter.update(second, 200, headers(4, 2))
+    assert limiter.acquire(second) == 0
+
+
+def test_late_response_does_not_raise_remaining():
+    limiter = RateLimiter()
+    url = HOOK.format(0)
+    limiter.acquire(url)
+    limiter.update(url, 200, headers(4, 2))
+    for _ in range(4):
+        assert limiter.acquire(url) == 0
+
+    # Answer to the first of those four: the server had not seen the other three yet
+    limiter.update(url, 200, headers(3, 1.9))
+    assert limiter.acquire(url) > 0
+
+
+def test_answer_from_an_earlier_window_is_ignored():
+    limiter = RateLimiter()
+    url = HOOK.format(0)
+    limiter.acquire(url)
+    limiter.update(url, 200, headers(4, 1))
+    bucket = limiter._buckets["shared:discord.com/api/webhooks/0/token"]
+    bucket[0], bucket[1] = 5, time.monotonic() + 1     # a fresh window
+    limiter.update(url, 200, headers(0, 0.01))        # straggler from the previous one
+    assert bucket[0] == 5
+
+
+class FakeDiscord:
+    """Fixed-window limit per webhook with one shared bucket hash, random latency."""
+
+    def __init__(self, limit, window, latency):
+        self.limit, self.window, self.latency = limit, window, latency
+        self.windows = {}      # path -> [count, reset_at]
+        self.too_many = 0
+
+    async def __call__(self, request):
+        await asyncio.sleep(random.uniform(*self.latency) / 2)
+        now = time.monotonic()
+        win = self.windows.get(request.url.path)
+        if win is None or now >= win[1]:
+            win = self.windows[request.url.path] = [0, now + self.window]
+        reset_after = f"{win[1] - now:.3f}"
+        if win[0] >= self.limit:
+            self.too_many += 1
+            response = httpx.Response(429, json={"retry_after": float(reset_after), "global": False},
+                                      headers=headers(0, reset_after, self.limit))
+        else:
+            win[0] += 1
+            response = httpx.Response(204, headers=headers(self.limit - win[0], reset_after, self.limit))
+        await asyncio.sleep(random.uniform(*self.latency) / 2)
+        return response
+
+
+def run_burst(server, urls):
+    dispatcher = DiscordDispatcher(limiter=RateLimiter())
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as client:
+            return await asyncio.gather(*(dispatcher.asend(url, {"content": "x"}, client) for url in urls))
+
+    started = time.monotonic()
+    results = asyncio.run(main())
+    return results, time.monotonic() - started
+
+
+def test_concurrent_burst_stays_under_the_limit():
+    random.seed(1)
+    server = FakeDiscord(limit=5, window=0.25, latency=(0.01, 0.08))
+    results, _ = run_burst(server, [HOOK.format(0)] * 40)
+    assert all(r.ok for r in results)
+    assert server.too_many == 0
+
+
+def test_webhooks_sharing_a_bucket_hash_send_in_parallel():
+    random.seed(2)
+    server = FakeDiscord(limit=5, window=0.5, latency=(0.01, 0.05))
+    results, elapsed = run_burst(server, [HOOK.format(i) for i in range(20) for _ in range(5)])
+    assert all(r.ok for r in results)
+    assert server.too_many == 0
+    # 5 per webhook fit in one window each; a shared budget would need 20 windows
+    assert elapsed < 2
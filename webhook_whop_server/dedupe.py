@@ -0,0 +1,38 @@
+# dedupe.py
+# Bounded in-memory set of recently seen Whop event ids (LRU + TTL).
+# This is only the fast path; the unique index on whop_events.event_id is the
+# source of truth and survives restarts.
+from collections import OrderedDict
+import time
+
+
+class RecentIds:
+    def __init__(self, maxsize=50000, ttl=24 * 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()   # event_id -> expires_at (monotonic)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, event_id):
+        expires = self._items.get(event_id)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._items[event_id]
+            return False
+        self._items.move_to_end(event_id)
+        return True
+
+    def add(self, event_id):
+        """Remember an id. Returns False if it was already known (a duplicate)."""
+        if event_id in self:
+            return False
+        self._items[event_id] = time.monotonic() + self.ttl
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return True
+
+    def discard(self, event_id):
+        self._items.pop(event_id, None)
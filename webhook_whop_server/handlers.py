@@ -0,0 +1,115 @@
+# handlers.py
+# Message builders for Whop event types: each takes the raw Whop event and
+# returns a Discord webhook payload (JSON bytes). Referenced by name from the
+# route table. The fixed parts of each message are compiled once at import.
+from embed_templates import EmbedTemplate
+
+FOOTER = "Whop Webhook System"
+
+PAYMENT_FAILED = EmbedTemplate(content="🚨 **Payment Failed Alert** 🚨", color=0xFF0000, footer_text=FOOTER)
+PAYMENT_SUCCEEDED = EmbedTemplate(content="💸 **Payment Received**", color=0x22C55E, footer_text=FOOTER)
+REFUND = EmbedTemplate(content="↩️ **Refund Issued**", color=0xF59E0B, footer_text=FOOTER)
+MEMBERSHIP_VALID = EmbedTemplate(content="✅ **Membership Activated**", color=0x22C55E, footer_text=FOOTER)
+MEMBERSHIP_INVALID = EmbedTemplate(content="⛔ **Membership Ended**", color=0x6B7280, footer_text=FOOTER)
+
+
+def _dict(value):
+    # Whop payloads are dicts, but a malformed event must still render (with
+    # placeholders) instead of failing every delivery attempt
+    return value if isinstance(value, dict) else {}
+
+
+def _details(data):
+    payload_data = _dict(data.get('data'))
+    product_info = _dict(payload_data.get('product'))
+    user_info = _dict(payload_data.get('user'))
+    return {
+        "product": product_info.get('title', 'Unknown Product'),
+        "email": user_info.get('email') or payload_data.get('email', 'N/A'),
+        "amount": payload_data.get('total') or payload_data.get('final_amount', 'N/A'),
+        "currency": str(payload_data.get('currency') or 'USD').upper(),
+        "status": payload_data.get('status'),
+    }
+
+
+def _render(template, title, fields, data):
+    fields = fields + [{"name": "Event ID", "value": str(data.get('id', 'N/A')), "inline": False}]
+    return template.render_bytes(title=title, fields=fields)
+
+
+def payment_failed(data):
+    d = _details(data)
+    return _render(
+        PAYMENT_FAILED,
+        f"Failed: {d['product']}",
+        [
+            {"name": "Product", "value": str(d['product']), "inline": False},
+            {"name": "Email", "value": str(d['email']), "inline": True},
+            {"name": "Amount", "value": f"{d['amount']} {d['currency']}", "inline": True},
+            {"name": "Status", "value": str(d['status'] or 'failed'), "inline": False},
+        ],
+        data,
+    )
+
+
+def payment_succeeded(data):
+    d = _details(data)
+    return _render(
+        PAYMENT_SUCCEEDED,
+        f"Paid: {d['product']}",
+        [
+            {"name": "Product", "value": str(d['product']), "inline": False},
+            {"name": "Email", "value": str(d['email']), "inline": True},
+            {"name": "Amount", "value": f"{d['amount']} {d['currency']}", "inline": True},
+        ],
+        data,
+    )
+
+
+def refund(data):
+    d = _details(data)
+    return _render(
+        REFUND,
+        f"Refunded: {d['product']}",
+        [
+            {"name": "Product", "value": str(d['product']), "inline": False},
+            {"name": "Email", "value": str(d['email']), "inline": True},
+            {"name": "Amount", "value": f"{d['amount']} {d['currency']}", "inline": True},
+        ],
+        data,
+    )
+
+
+def membership_valid(data):
+    d = _details(data)
+    return _render(
+        MEMBERSHIP_VALID,
+        f"Joined: {d['product']}",
+        [
+            {"name": "Product", "value": str(d['product']), "inline": False},
+            {"name": "Email", "value": str(d['email']), "inline": True},
+        ],
+        data,
+    )
+
+
+def membership_invalid(data):
+    d = _details(data)
+    return _render(
+        MEMBERSHIP_INVALID,
+        f"Left: {d['product']}",
+        [
+            {"name": "Product", "value": str(d['product']), "inline": False},
+            {"name": "Email", "value": str(d['email']), "inline": True},
+        ],
+        data,
+    )
+
+
+HANDLERS = {
+    "payment_failed": payment_failed,
+    "payment_succeeded": payment_succeeded,
+    "refund": refund,
+    "membership_valid": membership_valid,
+    "membership_invalid": membership_invalid,
+}
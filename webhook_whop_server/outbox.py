@@ -0,0 +1,199 @@
+# outbox.py
+# Durable outbox for Whop events, stored in the shared db.py database.
+# All functions here are blocking; the server calls them via asyncio.to_thread.
+from datetime import datetime, timedelta
+import json
+import os
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import SessionLocal, engine
+from models import WhopEvent
+
+RETRY_BASE = float(os.environ.get("OUTBOX_RETRY_BASE", "5"))     # seconds, doubled per failed attempt
+RETRY_MAX = float(os.environ.get("OUTBOX_RETRY_MAX", "600"))
+MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "12"))            # then dead-lettered (~1h of retries)
+RETENTION = float(os.environ.get("OUTBOX_RETENTION", str(7 * 24 * 3600)))  # seconds delivered rows are kept
+PRUNE_BATCH = int(os.environ.get("OUTBOX_PRUNE_BATCH", "1000"))
+
+# Discord answers these for a deleted or invalid webhook; retrying won't help
+PERMANENT_CODES = (401, 403, 404)
+
+# Rows still waiting for delivery; spelled like the ix_whop_events_pending predicate
+PENDING = (WhopEvent.delivered_at.is_(None), WhopEvent.dead_at.is_(None))
+
+
+def event_key(data, message_id=None):
+    """
+    Idempotency key: Whop's message id, else the webhook-id header (the same on
+    every retry of one delivery), else "<type>:<object id>" so different event
+    types about the same payment don't collide. None if there is nothing to key on.
+    """
+    key = data.get('id') or message_id
+    if key:
+        return str(key)
+    payload = data.get('data')
+    object_id = payload.get('id') if isinstance(payload, dict) else None
+    return f"{data.get('type')}:{object_id}" if object_id else None
+
+
+def _insert_ignore_duplicates():
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(WhopEvent).on_conflict_do_nothing(index_elements=["event_id"])
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(WhopEvent).on_conflict_do_nothing(index_elements=["event_id"])
+    return insert(WhopEvent)
+
+
+def write_events(events):
+    """
+    Append a batch of received (event, event_key) pairs in ONE transaction
+    (group commit). Events whose key is already stored are skipped by the
+    unique index.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "event_id": event_id,
+            "event_type": data.get('type'),
+            "payload": json.dumps(data),
+            "received_at": now,
+            "attempts": 0,
+        }
+        for data, event_id in events
+    ]
+    session = SessionLocal()
+    try:
+        session.execute(_insert_ignore_duplicates(), rows)
+        session.commit()
+    finally:
+        session.close()
+
+
+def fetch_due(limit):
+    """
+    Undelivered events whose retry time has come, oldest first:
+    [(id, payload_dict, attempts, delivered_urls)], where delivered_urls is the
+    set of targets an earlier attempt already reached.
+    """
+    now = datetime.utcnow()
+    session = SessionLocal()
+    try:
+        rows = session.execute(
+            select(WhopEvent.id, WhopEvent.payload, WhopEvent.attempts, WhopEvent.delivered_urls)
+            .where(
+                *PENDING,
+                (WhopEvent.next_attempt_at.is_(None)) | (WhopEvent.next_attempt_at <= now),
+            )
+            .order_by(WhopEvent.id)
+            .limit(limit)
+        ).all()
+    finally:
+        session.close()
+    return [
+        (row_id, json.loads(payload), attempts or 0, set(json.loads(delivered)) if delivered else set())
+        for row_id, payload, attempts, delivered in rows
+    ]
+
+
+def mark_results(results):
+    """
+    Record a delivery round. `results` is
+    [(id, attempts_before, ok, error, status_code, delivered_urls)].
+    Delivered rows get delivered_at; failures back off exponentially until
+    MAX_ATTEMPTS, or a permanent Discord error, dead-letters them (dead_at).
+    A failed row keeps the targets it did reach, so a retry only sends to the
+    rest. Dead letters are kept for inspection; clear dead_at to retry one.
+    """
+    if not results:
+        return
+    now = datetime.utcnow()
+    params = []
+    for row_id, attempts, ok, error, status_code, delivered in results:
+        if ok:
+            params.append({"id": row_id, "attempts": attempts + 1, "delivered_at": now, "last_error": None})
+            continue
+        error = (error or "unknown error")[:500]
+        delivered = json.dumps(sorted(delivered)) if delivered else None
+        if attempts + 1 >= MAX_ATTEMPTS or status_code in PERMANENT_CODES:
+            print(f"Outbox row {row_id} dead-lettered after {attempts + 1} attempt(s): {error}")
+            params.append({"id": row_id, "attempts": attempts + 1, "dead_at": now, "last_error": error,
+                           "delivered_urls": delivered})
+        else:
+            delay = min(RETRY_BASE * (2 ** attempts), RETRY_MAX)
+            params.append({
+                "id": row_id,
+                "attempts": attempts + 1,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "last_error": error,
+                "delivered_urls": delivered,
+            })
+
+    session = SessionLocal()
+    try:
+        # Delivered, dead and retried rows carry different column sets -> one executemany each
+        for key in ("delivered_at", "dead_at", "next_attempt_at"):
+            group = [p for p in params if key in p]
+            if group:
+                session.execute(update(WhopEvent), group)
+        session.commit()
+    finally:
+        session.close()
+
+
+def prune_delivered(retention=RETENTION, batch_size=PRUNE_BATCH):
+    """
+    Delete rows delivered more than `retention` seconds ago, one batch per
+    transaction. Keep `retention` above the server's DEDUPE_TTL: the stored
+    event_id is what drops a redelivery after a restart. Returns rows removed.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=retention)
+    total = 0
+    while True:
+        session = SessionLocal()
+        try:
+            # Oldest ids first: delivered rows sit at the low end of the primary key
+            ids = session.execute(
+                select(WhopEvent.id)
+                .where(WhopEvent.delivered_at.is_not(None), WhopEvent.delivered_at < cutoff)
+                .order_by(WhopEvent.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if ids:
+                session.execute(delete(WhopEvent).where(WhopEvent.id.in_(ids)))
+                session.commit()
+        finally:
+            session.close()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+
+
+def recent_event_ids(limit):
+    """Newest stored event ids, to warm the in-memory dedupe set after a restart."""
+    session = SessionLocal()
+    try:
+        rows = session.execute(
+            select(WhopEvent.event_id)
+            .where(WhopEvent.event_id.is_not(None))
+            .order_by(WhopEvent.id.desc())
+            .limit(limit)
+        ).scalars().all()
+    finally:
+        session.close()
+    return list(reversed(rows))
+
+
+def backlog_stats():
+    """Pending count, age of the oldest undelivered event and dead letters, for /metrics."""
+    session = SessionLocal()
+    try:
+        pending, oldest = session.execute(
+            select(func.count(WhopEvent.id), func.min(WhopEvent.received_at)).where(*PENDING)
+        ).one()
+        dead = session.execute(select(func.count(WhopEvent.id)).where(WhopEvent.dead_at.is_not(None))).scalar()
+    finally:
+        session.close()
+    age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    return {"outbox_pending": pending, "outbox_oldest_age_seconds": round(age, 1), "outbox_dead": dead}
@@ -0,0 +1,129 @@
+# routing.py
+# Event-type -> (handler, Discord targets) dispatch table for the Whop receiver.
+#
+# Routes come from a JSON file (WHOP_ROUTES_FILE, default routes.json next to
+# this file) or, if there is none, from DEFAULT_ROUTES. Example:
+#
+#   {
+#     "payment.failed":        {"handler": "payment_failed", "service": "Whop Alerts"},
+#     "payment.succeeded":     {"handler": "payment_succeeded", "groups": ["Chipotle Flips"]},
+#     "membership.went_valid": {"handler": "membership_valid", "service": "Whop Members"}
+#   }
+#
+# "service" sends to every enabled link of that Service (link webhook, else the
+# group webhook); "groups" sends to those groups' own webhooks. A route with no
+# targets falls back to DISCORD_WEBHOOK_URL.
+#
+# The table is compiled into a plain dict once and rebuilt only when the file or
+# the URLs its routes resolve to change, so requests never touch the DB to route.
+from dataclasses import dataclass
+import json
+import os
+
+from sqlalchemy import select
+
+from db import SessionLocal
+from models import Group, GroupService, Service
+from handlers import HANDLERS
+
+ROUTES_FILE = os.environ.get("WHOP_ROUTES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "routes.json"))
+
+DEFAULT_ROUTES = {
+    "payment.failed": {"handler": "payment_failed"},
+    "payment_failed": {"handler": "payment_failed"},
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    event_type: str
+    handler: object
+    urls: tuple     # empty -> use the fallback URL
+
+
+def load_route_config(path=ROUTES_FILE):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return DEFAULT_ROUTES
+
+
+def resolve_targets(session, config):
+    """
+    The Discord URLs each routed service and group resolves to, as a sorted
+    tuple of (kind, name, url). Only the rows the routes name are read (two
+    indexed queries), and any config change that matters (rename, cleared
+    URL, toggle) changes the result, so it doubles as the table's signature.
+    """
+    service_names = {r["service"] for r in config.values() if r.get("service")}
+    group_names = {g for r in config.values() for g in (r.get("groups") or [])}
+
+    targets = set()
+    if service_names:
+        rows = session.execute(
+            select(Service.name, GroupService.webhook_url, Group.webhook_url)
+            .join(GroupService, GroupService.service_id == Service.id)
+            .join(Group, GroupService.group_id == Group.id)
+            .where(Service.name.in_(service_names), GroupService.enabled == True)
+        )
+        for svc_name, link_url, group_url in rows:
+            url = link_url or group_url
+            if url:
+                targets.add(("service", svc_name, url))
+
+    if group_names:
+        rows = session.execute(
+            select(Group.name, Group.webhook_url).where(Group.name.in_(group_names), Group.webhook_url.is_not(None))
+        )
+        for group_name, url in rows:
+            targets.add(("group", group_name, url))
+    return tuple(sorted(targets))
+
+
+def compile_routes(config, targets):
+    """Build {event_type: Route} from the route config and resolve_targets() output."""
+    service_urls, group_urls = {}, {}
+    for kind, name, url in targets:
+        (service_urls if kind == "service" else group_urls).setdefault(name, []).append(url)
+
+    table = {}
+    for event_type, spec in config.items():
+        handler = HANDLERS.get(spec.get("handler"))
+        if handler is None:
+            print(f"Route {event_type}: unknown handler {spec.get('handler')!r}, skipped")
+            continue
+        urls = list(service_urls.get(spec.get("service"), []))
+        for group_name in spec.get("groups") or []:
+            urls.extend(group_urls.get(group_name, []))
+        table[event_type] = Route(event_type, handler, tuple(dict.fromkeys(urls)))
+    return table
+
+
+class Router:
+    def __init__(self, path=ROUTES_FILE):
+        self.path = path
+        self.table = {}
+        self.signature = None
+        self._config = None
+        self._mtime = None
+
+    def get(self, event_type):
+        return self.table.get(event_type)
+
+    def refresh(self):
+        """Rebuild the table if the route file or the targets it resolves to changed. Returns True if rebuilt."""
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if self._config is None or mtime != self._mtime:
+            self._config, self._mtime = load_route_config(self.path), mtime
+        session = SessionLocal()
+        try:
+            targets = resolve_targets(session, self._config)
+        finally:
+            session.close()
+        signature = (mtime, targets)
+        if signature == self.signature:
+            return False
+        # Swap in one assignment; readers see either the old or the new table
+        self.table = compile_routes(self._config, targets)
+        self.signature = signature
+        return True
@@ -0,0 +1,54 @@
+# signature.py
+# Whop signs webhooks with the Standard Webhooks scheme:
+#   headers  webhook-id, webhook-timestamp, webhook-signature ("v1,<base64>" ...)
+#   signed   "{webhook-id}.{webhook-timestamp}.{raw body}" with HMAC-SHA256
+# Everything here works on raw bytes so a bad request is rejected before JSON parsing.
+import base64
+import hashlib
+import hmac
+import time
+
+TOLERANCE = 300   # seconds of clock skew / replay window
+
+
+class SignatureError(Exception):
+    pass
+
+
+def signing_key(secret):
+    """'whsec_<base64>' secrets are base64 keys; Whop's plain secrets are used as-is."""
+    if secret.startswith("whsec_"):
+        return base64.b64decode(secret[len("whsec_"):])
+    return secret.encode()
+
+
+def check_headers(headers, now=None, tolerance=TOLERANCE):
+    """Cheap pre-body check. Returns (msg_id, timestamp, signatures) or raises SignatureError."""
+    msg_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature")
+    if not (msg_id and timestamp and signatures):
+        raise SignatureError("missing signature headers")
+    try:
+        ts = int(timestamp)
+    except ValueError:
+        raise SignatureError("bad timestamp")
+    now = time.time() if now is None else now
+    if abs(now - ts) > tolerance:
+        raise SignatureError("timestamp outside tolerance")
+    return msg_id, timestamp, signatures
+
+
+def sign(key, msg_id, timestamp, body):
+    mac = hmac.new(key, f"{msg_id}.{timestamp}.".encode() + body, hashlib.sha256)
+    return base64.b64encode(mac.digest()).decode()
+
+
+def verify(key, msg_id, timestamp, signatures, body):
+    """Constant-time compare against every v1 signature in the header."""
+    expected = sign(key, msg_id, timestamp, body)
+    for entry in signatures.split():
+        version, _, candidate = entry.partition(",")
+        if version == "v1" and hmac.compare_digest(candidate, expected):
+            return
+    raise SignatureError("signature mismatch")
@@ -1,5 +1,9 @@
 # test_failure.py
 import requests
+import json
+import os
+import time
+from signature import sign, signing_key
 
 url = "http://localhost:8000/webhook"
 
@@ -28,8 +32,22 @@ payload = {
     }
 }
 
+body = json.dumps(payload).encode()
+headers = {"Content-Type": "application/json"}
+
+# Sign like Whop does; an unsigned request is only accepted by a server
+# started with WHOP_ALLOW_UNSIGNED=1
+secret = os.environ.get("WHOP_WEBHOOK_SECRET")
+if secret:
+    msg_id, timestamp = payload["id"], str(int(time.time()))
+    headers.update({
+        "webhook-id": msg_id,
+        "webhook-timestamp": timestamp,
+        "webhook-signature": "v1," + sign(signing_key(secret), msg_id, timestamp, body),
+    })
+
 try:
-    response = requests.post(url, json=payload)
+    response = requests.post(url, data=body, headers=headers)
     print(f"Sent. Status Code: {response.status_code}")
 except Exception as e:
     print(f"Error: {e}")
\ No newline at end of file
@@ -1,70 +1,264 @@
 # webhook_server.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import asyncio
 import uvicorn
 import json
 import os
-import requests
+import sys
 
-app = FastAPI()
+# Share the Discord dispatch code that lives in the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_PROFILE", "server")   # pool sizing / timeouts, see db.py
+from discord_dispatch import DeliveryResult, get_dispatcher
+from http_pool import new_async_client
+from db import init_db
+import outbox
+from dedupe import RecentIds
+from routing import Router
+import signature
 
 # Get the URL from Render's Environment Variables (we set this later)
 DISCORD_WEBHOOK_URL = os.environ.get("DISCORD_WEBHOOK_URL")
 
-def send_discord_alert(data):
-    if not DISCORD_WEBHOOK_URL:
+# Outbox / delivery tuning
+DELIVERY_WORKERS = int(os.environ.get("DELIVERY_WORKERS", "4"))         # concurrent Discord posts
+DELIVERY_QUEUE_SIZE = int(os.environ.get("DELIVERY_QUEUE_SIZE", "10000"))  # events waiting to be written
+OUTBOX_BATCH = int(os.environ.get("OUTBOX_BATCH", "100"))               # rows per insert / delivery round
+OUTBOX_POLL = float(os.environ.get("OUTBOX_POLL", "5"))                 # seconds between retry sweeps
+DISCORD_TIMEOUT = float(os.environ.get("DISCORD_TIMEOUT", "10"))
+DEDUPE_SIZE = int(os.environ.get("DEDUPE_SIZE", "50000"))               # event ids kept in memory
+DEDUPE_TTL = float(os.environ.get("DEDUPE_TTL", str(24 * 3600)))
+ROUTES_REFRESH = float(os.environ.get("ROUTES_REFRESH", "30"))          # seconds between config checks
+OUTBOX_PRUNE_EVERY = float(os.environ.get("OUTBOX_PRUNE_EVERY", "3600"))  # seconds between retention sweeps
+MAX_BODY_BYTES = int(os.environ.get("MAX_BODY_BYTES", str(256 * 1024)))  # Whop events are a few KB
+
+# Whop signing secret; the server refuses to start without it unless
+# WHOP_ALLOW_UNSIGNED=1 is set (local testing only: every request is accepted)
+WHOP_WEBHOOK_SECRET = os.environ.get("WHOP_WEBHOOK_SECRET")
+SIGNING_KEY = signature.signing_key(WHOP_WEBHOOK_SECRET) if WHOP_WEBHOOK_SECRET else None
+ALLOW_UNSIGNED = os.environ.get("WHOP_ALLOW_UNSIGNED") == "1"
+
+seen_events = RecentIds(DEDUPE_SIZE, DEDUPE_TTL)
+router = Router()
+rejected = {"signature": 0, "too_large": 0, "bad_json": 0}
+write_queue = None     # (event, event_key, future) waiting for the group commit
+delivery_wakeup = None
+http_client = None
+
+
+async def send_discord_alert(data, delivered=frozenset()):
+    """
+    Post the event to its route's targets, skipping those in `delivered` (reached
+    by an earlier attempt). Returns (DeliveryResult, targets reached so far).
+    """
+    route = router.get(data.get('type'))
+    if route is None:
+        # Route was removed after the event was stored; nothing to deliver
+        return DeliveryResult(url="", ok=True), set(delivered)
+
+    urls = route.urls or ((DISCORD_WEBHOOK_URL,) if DISCORD_WEBHOOK_URL else ())
+    if not urls:
         print("Error: No Discord URL found in environment variables.")
-        return
-
-    payload_data = data.get('data', {})
-    product_info = payload_data.get('product') or {}
-    product_title = product_info.get('title', 'Unknown Product')
-    
-    user_info = payload_data.get('user') or {}
-    email = user_info.get('email') or payload_data.get('email', 'N/A')
-    
-    amount = payload_data.get('total') or payload_data.get('final_amount', 'N/A')
-    currency = payload_data.get('currency', 'USD').upper()
-    status = payload_data.get('status', 'failed')
-    
-    message = {
-        "content": "🚨 **Payment Failed Alert** 🚨",
-        "embeds": [
-            {
-                "title": f"Failed: {product_title}",
-                "color": 16711680,
-                "fields": [
-                    {"name": "Product", "value": str(product_title), "inline": False},
-                    {"name": "Email", "value": str(email), "inline": True},
-                    {"name": "Amount", "value": f"{amount} {currency}", "inline": True},
-                    {"name": "Status", "value": str(status), "inline": False},
-                    {"name": "Event ID", "value": data.get('id', 'N/A'), "inline": False}
-                ],
-                "footer": {"text": "Whop Webhook System"}
-            }
-        ]
-    }
-    
+        return DeliveryResult(url="", ok=False, error="no Discord target for route"), set(delivered)
+
+    # Dispatcher handles timeouts, retries and Discord rate limits.
+    # At-least-once per target: only the targets that failed are retried.
+    pending = [url for url in urls if url not in delivered]
+    message = route.handler(data)
+    dispatcher = get_dispatcher()
+    results = await asyncio.gather(*(dispatcher.asend(url, message, http_client) for url in pending))
+    reached = set(delivered) | {r.url for r in results if r.ok}
+    failed = [r for r in results if not r.ok]
+    if failed:
+        return DeliveryResult(url=failed[0].url, ok=False, status_code=failed[0].status_code,
+                              error=f"{len(failed)}/{len(urls)} targets failed: {failed[0].error}"), reached
+    print(f"-> Discord alert sent to {len(pending)} target(s)!")
+    return DeliveryResult(url=urls[0], ok=True), reached
+
+async def routes_refresher():
+    # Hot reload: a cheap signature query, full recompile only when something changed
+    while True:
+        await asyncio.sleep(ROUTES_REFRESH)
+        try:
+            if await asyncio.to_thread(router.refresh):
+                print(f"Routes reloaded: {sorted(router.table)}")
+        except Exception as e:
+            print(f"Route refresh failed: {e}")
+
+async def outbox_writer():
+    # Group commit: everything that arrived while the previous insert was running
+    # goes into the next one, so one transaction covers many requests under load.
+    while True:
+        batch = [await write_queue.get()]
+        while len(batch) < OUTBOX_BATCH and not write_queue.empty():
+            batch.append(write_queue.get_nowait())
+        try:
+            await asyncio.to_thread(outbox.write_events, [(data, event_id) for data, event_id, _ in batch])
+        except Exception as e:
+            print(f"Outbox write failed: {e}")
+            for *_, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            continue
+        for *_, fut in batch:
+            if not fut.done():
+                fut.set_result(True)
+        delivery_wakeup.set()
+
+async def deliver_row(sem, row_id, data, attempts, delivered):
+    async with sem:
+        try:
+            result, delivered = await send_discord_alert(data, delivered)
+            return row_id, attempts, result.ok, result.error, result.status_code, delivered
+        except Exception as e:
+            return row_id, attempts, False, str(e), None, delivered
+
+async def delivery_loop():
+    # At-least-once: a row is only marked delivered after Discord accepted it
+    sem = asyncio.Semaphore(DELIVERY_WORKERS)
+    while True:
+        delivery_wakeup.clear()
+        try:
+            rows = await asyncio.to_thread(outbox.fetch_due, OUTBOX_BATCH)
+            if rows:
+                results = await asyncio.gather(*(deliver_row(sem, *row) for row in rows))
+                await asyncio.to_thread(outbox.mark_results, results)
+                continue
+        except Exception as e:
+            print(f"Outbox delivery round failed: {e}")
+
+        try:
+            await asyncio.wait_for(delivery_wakeup.wait(), timeout=OUTBOX_POLL)
+        except asyncio.TimeoutError:
+            pass
+
+async def outbox_pruner():
+    # Retention: delivered rows are only needed for dedupe after a restart
+    while True:
+        try:
+            removed = await asyncio.to_thread(outbox.prune_delivered)
+            if removed:
+                print(f"Outbox: pruned {removed} delivered events")
+        except Exception as e:
+            print(f"Outbox prune failed: {e}")
+        await asyncio.sleep(OUTBOX_PRUNE_EVERY)
+
+@asynccontextmanager
+async def lifespan(app):
+    global write_queue, delivery_wakeup, http_client
+    if SIGNING_KEY is None:
+        if not ALLOW_UNSIGNED:
+            raise RuntimeError("WHOP_WEBHOOK_SECRET is not set; set it, or WHOP_ALLOW_UNSIGNED=1 for local testing")
+        print("Warning: WHOP_ALLOW_UNSIGNED=1, webhook signatures are NOT verified.")
+    init_db()     # migrations, incl. the outbox's unique event_id index
+    for event_id in outbox.recent_event_ids(DEDUPE_SIZE):
+        seen_events.add(event_id)
+    router.refresh()
+    write_queue = asyncio.Queue(maxsize=DELIVERY_QUEUE_SIZE)
+    delivery_wakeup = asyncio.Event()
+    http_client = new_async_client(timeout=DISCORD_TIMEOUT)
+    tasks = [
+        asyncio.create_task(outbox_writer()),
+        asyncio.create_task(delivery_loop()),
+        asyncio.create_task(routes_refresher()),
+        asyncio.create_task(outbox_pruner()),
+    ]
     try:
-        requests.post(DISCORD_WEBHOOK_URL, json=message)
-        print("-> Discord alert sent!")
-    except Exception as e:
-        print(f"Failed to send Discord alert: {e}")
+        yield
+    finally:
+        # Anything not yet delivered stays in the outbox for the next start
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await http_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+def reject(reason, status_code):
+    rejected[reason] += 1
+    return JSONResponse({"status": "rejected", "reason": reason}, status_code=status_code)
+
+async def read_body(request):
+    """Raw body, streamed with a hard cap. None if it is larger than MAX_BODY_BYTES."""
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
 
 @app.post("/webhook")
 async def receive_webhook(request: Request):
-    data = await request.json()
+    # Cheapest checks first: declared size and signature headers, before reading the body
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_BODY_BYTES:
+        return reject("too_large", 413)
+
+    message_id = request.headers.get("webhook-id")
+    if SIGNING_KEY is not None:
+        try:
+            signed = signature.check_headers(request.headers)
+        except signature.SignatureError:
+            return reject("signature", 401)
+    elif not ALLOW_UNSIGNED:
+        # Fail closed even if the startup check was bypassed
+        return reject("signature", 401)
+
+    body = await read_body(request)
+    if body is None:
+        return reject("too_large", 413)
+
+    # HMAC over the raw bytes; JSON is only decoded for authentic requests
+    if SIGNING_KEY is not None:
+        try:
+            signature.verify(SIGNING_KEY, *signed, body)
+        except signature.SignatureError:
+            return reject("signature", 401)
+
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return reject("bad_json", 400)
+    if not isinstance(data, dict):
+        return reject("bad_json", 400)
     event_type = data.get('type')
-    
-    # Note: On Render Free Tier, saving to a file (whop_data.json) 
-    # is temporary. It gets wiped when the server restarts. 
-    # We will focus on the Discord Alert for now.
-    
-    if event_type in ['payment.failed', 'payment_failed']:
-        send_discord_alert(data)
-        
+
+    # Dict lookup in the precompiled table; unrouted event types are acked and ignored
+    if router.get(event_type) is not None:
+        # Whop retries deliveries; drop copies we already accepted before any work.
+        # (Ids that fell out of memory are still caught by the DB unique index.)
+        event_id = outbox.event_key(data, message_id)
+        if event_id and not seen_events.add(event_id):
+            return {"status": "duplicate"}
+
+        # Persist first (batched with concurrent requests), then acknowledge Whop.
+        # The delivery loop posts to Discord from the outbox.
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            write_queue.put_nowait((data, event_id, fut))
+            await fut
+        except Exception:
+            if event_id:
+                seen_events.discard(event_id)
+            # Let Whop retry later rather than silently dropping the alert
+            return JSONResponse({"status": "busy"}, status_code=503)
+
     return {"status": "ok"}
 
-# This block is for local testing only. 
+@app.get("/metrics")
+async def metrics():
+    stats = await asyncio.to_thread(outbox.backlog_stats)
+    stats["write_queue"] = write_queue.qsize()
+    stats["dedupe_ids"] = len(seen_events)
+    stats["rejected"] = dict(rejected)
+    stats["discord"] = dict(get_dispatcher().stats)
+    return stats
+
+# This block is for local testing only.
 # Render runs the app using the command we give it in the dashboard.
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)